@@ -1,4 +1,5 @@
 import os
+import asyncio
 import tempfile
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
@@ -70,9 +71,9 @@ class EmailProcessor(BaseProcessor):
                                 date_gte=date_from
                             )
                             
-                            for msg in mailbox.fetch(criteria):
-                                security_results = await self.email_security.verify_email_security(msg, imp_type)
-                                
+                            async for msg, security_results in self.email_security.verify_email_security_batch(
+                                mailbox.fetch(criteria), imp_type, folder
+                            ):
                                 if all(security_results.values()):
                                     emails.append({
                                         'uid': msg.uid,
@@ -118,7 +119,9 @@ class EmailProcessor(BaseProcessor):
                     raise ValueError(f"Email with UID {uid} not found in folder {folder}")
                 
                 # Verify email security for this import type
-                security_results = await self.email_security.verify_email_security(msg, import_type)
+                security_results = await self.email_security.verify_email_security(
+                    msg, import_type, folder=folder
+                )
                 
                 if not all(security_results.values()):
                     failed_checks = [k for k, v in security_results.items() if not v]
@@ -155,7 +158,11 @@ class EmailProcessor(BaseProcessor):
             extract_dir = os.path.join(temp_dir, 'extracted')
             os.makedirs(extract_dir, exist_ok=True)
             
-            extracted_files = self.file_security.secure_extract_zip(
+            # Extract in a worker thread so the event loop stays responsive
+            loop = asyncio.get_running_loop()
+            extracted_files = await loop.run_in_executor(
+                None,
+                self.file_security.secure_extract_zip,
                 zip_path, 
                 extract_dir, 
                 import_type
@@ -1,6 +1,10 @@
 import os
+import mmap
+import asyncio
 import logging
-from typing import List, Dict, Tuple
+import zipfile
+import functools
+from typing import AsyncIterator, BinaryIO, Callable, Iterable, Iterator, List, Dict, Optional, Tuple, Union
 from datetime import datetime
 from sqlalchemy import text, Column, Integer
 from sqlalchemy.orm import Session
@@ -9,11 +13,128 @@ import defusedxml.ElementTree as ET
 import json
 from pathlib import Path
 
+from defusedxml import DTDForbidden
+
 from .base_processor import BaseProcessor
 from ..config.config_loader import ConfigLoader
-from ..utils.data_converter import convert_field
+from ..security.file_security import SecureFileProcessor
+from ..utils.data_converter import convert_column, convert_field
 from ..utils.file_hash_tracker import FileHashTracker
 
+try:
+    from lxml import etree as LET
+except ImportError:
+    LET = None
+
+# Hardened lxml parser options: no entity expansion, no network, no huge trees
+LXML_PARSER_OPTIONS = {
+    'resolve_entities': False,
+    'no_network': True,
+    'huge_tree': False,
+    'remove_blank_text': True,
+    'collect_ids': False
+}
+
+# Reference file source: a path, or a callable opening a binary stream
+XMLSource = Union[str, Callable[[], BinaryIO]]
+
+# Files larger than this are memory-mapped and handed to lxml as a buffer
+XML_MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# Read size used when feeding files to a streaming parser
+XML_FEED_CHUNK_SIZE = 1024 * 1024
+
+# Records buffered per field column before conversion and saving
+RECORD_BATCH_SIZE = 1000
+
+def _reject_dtd(tree):
+    """Raise DTDForbidden if an lxml document declares a DTD"""
+    docinfo = tree.docinfo
+    if docinfo.doctype:
+        raise DTDForbidden(docinfo.root_name, docinfo.system_url, docinfo.public_id)
+
+class _RecordTarget:
+    """
+    Parser target collecting mapped field text for each record element
+    
+    Mirrors elem.find('.//field').text for every mapped field: the first
+    descendant with a matching tag wins, and only the text before its first
+    child is kept. No element objects are built. Records are buffered
+    column-wise (one list per field) and handed to on_batch every
+    batch_size records, and once more when parsing finishes.
+    """
+    
+    def __init__(self, record_tag: str, field_tags,
+                 on_batch: Callable[[Dict[str, List[Optional[str]]], int], None],
+                 batch_size: int = RECORD_BATCH_SIZE):
+        self.record_tag = record_tag
+        self.field_tags = frozenset(field_tags)
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.columns: Dict[str, List[Optional[str]]] = {tag: [] for tag in self.field_tags}
+        self.count = 0
+        self._values: Optional[Dict[str, str]] = None
+        self._depth = 0
+        self._capture: Optional[str] = None
+        self._text: List[str] = []
+    
+    def doctype(self, name, pubid, system):
+        raise DTDForbidden(name, system, pubid)
+    
+    def start(self, tag, attrib):
+        if self._values is None:
+            if tag == self.record_tag:
+                self._values = {}
+                self._depth = 0
+            return
+        
+        self._finish_capture()
+        self._depth += 1
+        if tag in self.field_tags and tag not in self._values:
+            self._values[tag] = None
+            self._capture = tag
+    
+    def data(self, data):
+        if self._capture is not None:
+            self._text.append(data)
+    
+    def end(self, tag):
+        if self._values is None:
+            return
+        
+        self._finish_capture()
+        if self._depth > 0:
+            self._depth -= 1
+            return
+        
+        values, self._values = self._values, None
+        for field_tag, column in self.columns.items():
+            column.append(values.get(field_tag))
+        self.count += 1
+        if self.count >= self.batch_size:
+            self._flush()
+    
+    def close(self):
+        self._flush()
+    
+    def _finish_capture(self):
+        if self._capture is not None:
+            self._values[self._capture] = ''.join(self._text) or None
+            self._capture = None
+            self._text = []
+    
+    def _flush(self):
+        if self.count:
+            columns, count = self.columns, self.count
+            self.columns = {tag: [] for tag in self.field_tags}
+            self.count = 0
+            self.on_batch(columns, count)
+
+async def _as_async(iterable: Iterable) -> AsyncIterator:
+    """Adapt an iterable of reference sources for ReferenceProcessor._process_sources"""
+    for item in iterable:
+        yield item
+
 class ReferenceProcessor(BaseProcessor):
     """Handles processing of reference data files"""
 
@@ -21,50 +142,177 @@ class ReferenceProcessor(BaseProcessor):
         """Initialize reference processor"""
         super().__init__(is_cron=is_cron)
         self.config_loader = ConfigLoader()
+        self.file_security = SecureFileProcessor(self.config_loader)
         self.file_hash_tracker = FileHashTracker(is_cron=is_cron)
         self.force_process = force_process
         self._lookup_cache = {}
+        self._reference_orders: Dict[str, Tuple[str, ...]] = {}
+        self._xml_parser = None
 
     async def process_reference_files(self, temp_dir: str, import_type: str, session: Session) -> Tuple[List[str], List[str]]:
             """Process all reference files for an import type"""
             self.update_progress('process', 'working')
-            processed_files = []
-            skipped_files = []
             
             try:
-                reference_order = self.config_loader.get_reference_order(import_type)
-                total_refs = len(reference_order)
-                processed = 0
+                sources = (
+                    (ref_file, (entry.path, None) if entry is not None else None)
+                    for ref_file, entry in self.iter_reference_files(temp_dir, import_type)
+                )
                 
-                for ref_file in reference_order:
-                    file_path = os.path.join(temp_dir, ref_file)
+                return await self._process_sources(_as_async(sources), temp_dir, import_type, session)
                     
-                    if os.path.exists(file_path):
-                        try:
-                            # Process file
-                            self._process_file(file_path, import_type, session)
-                            
-                            # Explicitly commit after each file
-                            session.commit()
-                            
-                            processed_files.append(ref_file)
-                            processed += 1
-                            progress = int((processed / total_refs) * 100)
-                            self.update_progress('process', 'working', progress)
-                            
-                        except Exception as e:
-                            session.rollback()  # Rollback on error
-                            self.logger.error(f"Error processing {ref_file}: {str(e)}")
-                            raise
-                    else:
-                        self.logger.warning(f"File not found: {file_path}")
-                        skipped_files.append(ref_file)
-                
-                return processed_files, skipped_files
+            except Exception as e:
+                raise self.handle_error("Reference processing failed", e, session)
+
+    async def process_reference_archive(self, zip_path: str, import_type: str, session: Session) -> Tuple[List[str], List[str]]:
+            """
+            Process reference files straight from a ZIP archive, without extracting
+            
+            Each member is decompressed once, directly into the parser. The
+            archive and its members are first checked as secure_extract_zip
+            would: file size and type, member count, sizes, compression
+            ratios, names and types.
+            
+            Args:
+                zip_path: Path to ZIP file
+                import_type: Type of import
+                session: Database session
+            """
+            self.update_progress('process', 'working')
+            
+            try:
+                self.file_security.validate_file(zip_path, import_type)
+                with zipfile.ZipFile(zip_path) as zip_ref:
+                    members = {
+                        member_path: (functools.partial(zip_ref.open, info), info.file_size)
+                        for info, member_path in self.file_security.check_zip_members(
+                            zip_ref, zip_path, import_type
+                        )
+                    }
+                    sources = (
+                        (ref_file, members.get(ref_file))
+                        for ref_file in self._get_reference_order(import_type)
+                    )
+                    
+                    return await self._process_sources(_as_async(sources), zip_path, import_type, session)
                     
             except Exception as e:
                 raise self.handle_error("Reference processing failed", e, session)
 
+    async def process_extraction_queue(self, queue: asyncio.Queue, extract_dir: str, import_type: str,
+                                       session: Session) -> Tuple[List[str], List[str]]:
+        """
+        Process reference files while they are still being extracted
+        
+        Each reference file is processed as soon as it and all files before it
+        in reference order are available, overlapping parsing with extraction.
+        
+        Args:
+            queue: Queue fed by SecureFileProcessor.secure_extract_zip_async
+            extract_dir: Directory files are extracted to
+            import_type: Type of import
+            session: Database session
+        """
+        self.update_progress('process', 'working')
+        
+        try:
+            return await self._process_sources(
+                self._iter_queued_files(queue, extract_dir, import_type), extract_dir, import_type, session
+            )
+            
+        except Exception as e:
+            raise self.handle_error("Reference processing failed", e, session)
+
+    async def _iter_queued_files(self, queue: asyncio.Queue, extract_dir: str,
+                                 import_type: str) -> AsyncIterator[Tuple[str, Optional[Tuple[XMLSource, Optional[int]]]]]:
+        """Yield queued extracted files in reference order, waiting for each one to land"""
+        arrived = {}
+        finished = False
+        
+        for ref_file in self._get_reference_order(import_type):
+            while ref_file not in arrived and not finished:
+                item = await queue.get()
+                if item is None:
+                    finished = True
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    arrived[os.path.relpath(item, extract_dir)] = item
+            
+            file_path = arrived.get(ref_file)
+            yield ref_file, (file_path, None) if file_path is not None else None
+
+    def iter_reference_files(self, directory: str, import_type: str) -> Iterator[Tuple[str, Optional[os.DirEntry]]]:
+        """
+        Yield reference files of a directory in configured reference order
+        
+        The directory is listed once; each reference file name is yielded with
+        its directory entry, or None if the file is missing.
+        
+        Args:
+            directory: Directory containing reference files
+            import_type: Type of import
+        """
+        with os.scandir(directory) as entries:
+            available = {entry.name: entry for entry in entries if entry.is_file()}
+        
+        for ref_file in self._get_reference_order(import_type):
+            yield ref_file, available.get(ref_file)
+
+    async def _process_sources(self, sources: AsyncIterator[Tuple[str, Optional[Tuple[XMLSource, Optional[int]]]]],
+                               location: str, import_type: str, session: Session) -> Tuple[List[str], List[str]]:
+        """
+        Process reference sources in the order given
+        
+        Args:
+            sources: File names in reference order, each with its source and size
+                (if known), or None if the file is missing
+            location: Directory or archive the sources come from, for logging
+            import_type: Type of import
+            session: Database session
+            
+        Returns:
+            Tuple of (processed file names, skipped file names)
+        """
+        processed_files = []
+        skipped_files = []
+        total_refs = len(self._get_reference_order(import_type))
+        processed = 0
+        
+        async for ref_file, available in sources:
+            if available is not None:
+                source, file_size = available
+                file_path = os.path.join(location, ref_file)
+                try:
+                    # Process file
+                    self._process_file(file_path, import_type, session, file_size, source)
+                    
+                    # Explicitly commit after each file
+                    session.commit()
+                    
+                    processed_files.append(ref_file)
+                    processed += 1
+                    progress = int((processed / total_refs) * 100)
+                    self.update_progress('process', 'working', progress)
+                    
+                except Exception as e:
+                    session.rollback()  # Rollback on error
+                    self.logger.error(f"Error processing {ref_file}: {str(e)}")
+                    raise
+            else:
+                self.logger.warning(f"File not found: {os.path.join(location, ref_file)}")
+                skipped_files.append(ref_file)
+        
+        return processed_files, skipped_files
+
+    def _get_reference_order(self, import_type: str) -> Tuple[str, ...]:
+        """Get reference file order for import type, cached per processor"""
+        reference_order = self._reference_orders.get(import_type)
+        if reference_order is None:
+            reference_order = tuple(self.config_loader.get_reference_order(import_type))
+            self._reference_orders[import_type] = reference_order
+        return reference_order
+
     def _perform_lookup(self, session: Session, table: str, query: str, value: str) -> any:
         """Perform database lookup with NULL fallback"""
         try:
@@ -90,8 +338,10 @@ class ReferenceProcessor(BaseProcessor):
             self.logger.error(f"Lookup error for value {value} in {table}: {str(e)}")
             return None
 
-    def _process_file(self, file_path: str, import_type: str, session: Session):
-        """Process a single reference file"""
+    def _process_file(self, file_path: str, import_type: str, session: Session,
+                      file_size: Optional[int] = None, source: Optional[XMLSource] = None):
+        """Process a single reference file, read from source if given"""
+        source = file_path if source is None else source
         # Get file info
         file_name = os.path.basename(file_path)
         file_ext = Path(file_path).suffix.lower()
@@ -102,23 +352,23 @@ class ReferenceProcessor(BaseProcessor):
             
             # Process based on file type
             if file_ext == '.xml':
-                self._process_xml_file(file_path, mapping, session)
+                self._process_xml_file(file_path, mapping, session, file_size, source)
             elif file_ext == '.json':
-                self._process_json_file(file_path, mapping, session)
+                self._process_json_file(file_path, mapping, session, source)
             else:
                 raise ValueError(f"Unsupported file type: {file_ext}")
                 
         except Exception as e:
             raise self.handle_error(f"Error processing {file_name}", e, session)
 
-    def _process_xml_file(self, file_path: str, mapping: Dict, session: Session):
+    def _process_xml_file(self, file_path: str, mapping: Dict, session: Session,
+                          file_size: Optional[int] = None, source: Optional[XMLSource] = None):
         """Process XML reference file"""
+        source = file_path if source is None else source
         try:
             self.logger.info(f"Processing XML file: {file_path}")
-            
-            # Parse XML safely
-            tree = ET.parse(file_path)
-            root = tree.getroot()
+            if file_size is not None and self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"XML file size: {file_size:,} bytes")
             
             # Get table configurations
             table_configs = mapping.get('tables', [])
@@ -135,59 +385,28 @@ class ReferenceProcessor(BaseProcessor):
                 self.logger.info(f"Processing table: {table_name}")
                 self.logger.info(f"Root element: '{root_element}'")
                 
-                # Find elements to process
-                elements = root.findall(f".//{root_element}") if root_element else [root]
-                self.logger.info(f"Found {len(elements)} elements to process")
-                
                 processed = 0
-                for elem in elements:
-                    data = {}
-                    
-                    # Process fields according to mapping
-                    for xml_key, field_config in table_config['fields'].items():
-                        field_elem = elem.find(f".//{xml_key}")
-                        if field_elem is not None and field_elem.text:
-                            value = field_elem.text.strip()
-                            
-                            # Handle lookup fields
-                            if 'lookup' in field_config:
-                                lookup_config = field_config['lookup']
-                                lookup_value = self._perform_lookup(
-                                    session,
-                                    lookup_config['table'],
-                                    lookup_config['query'],
-                                    value
-                                )
-                                # Set value to None if lookup fails (instead of raising error)
-                                data[field_config['db_field']] = lookup_value
-                                if lookup_value is None:
-                                    self.logger.warning(
-                                        f"No matching record found in {lookup_config['table']} "
-                                        f"for value: {value} - setting to NULL"
-                                    )
-                            else:
-                                # Regular field conversion
-                                converted = convert_field(
-                                    value,
-                                    field_config['type'],
-                                    field_config.get('format')
-                                )
-                                if converted is not None:
-                                    data[field_config['db_field']] = converted
-                    
-                    # Add timestamps
-                    now = datetime.utcnow()
-                    if 'created' not in data:
-                        data['created'] = now
-                    if 'modified' not in data:
-                        data['modified'] = now
-                    
-                    # Save to database
-                    if data:
-                        self._save_record(table_name, data, session)
-                        processed += 1
-                        if processed % 100 == 0:
-                            self.logger.info(f"Processed {processed} records for {table_name}")
+                
+                def save_batch(columns: Dict[str, List[Optional[str]]], count: int):
+                    nonlocal processed
+                    records = self._build_records(columns, count, table_config['fields'], session)
+                    for data in records:
+                        # Save to database
+                        if data:
+                            self._save_record(table_name, data, session)
+                            processed += 1
+                            if processed % 100 == 0:
+                                self.logger.info(f"Processed {processed} records for {table_name}")
+                
+                # Stream record fields through a parser target; only root-level
+                # mappings need the full tree
+                if root_element:
+                    target = _RecordTarget(root_element, table_config['fields'], save_batch)
+                    self._parse_with_target(source, target)
+                else:
+                    root = self._parse_xml(source, file_size).getroot()
+                    values = self._extract_fields(root, table_config['fields'])
+                    save_batch({xml_key: [values.get(xml_key)] for xml_key in table_config['fields']}, 1)
                 
                 self.logger.info(f"Total records processed for {table_name}: {processed}")
                 
@@ -195,13 +414,157 @@ class ReferenceProcessor(BaseProcessor):
             self.logger.error("Error processing XML file", exc_info=True)
             raise
 
-    def _process_json_file(self, file_path: str, mapping: Dict, session: Session):
+    def _parse_xml(self, source: XMLSource, file_size: Optional[int] = None):
+        """
+        Parse XML file with lxml's C parser, falling back to defusedxml's ElementTree
+        
+        The lxml parser is configured not to resolve entities or touch the
+        network, and documents declaring a DTD are rejected, matching the
+        protections defusedxml provides in a single parsing pass. Large files
+        are memory-mapped so libxml2 reads straight from the page cache; their
+        size is taken from the open descriptor when not already known. One
+        parser instance is reused across files and replaced after a failure.
+        
+        Args:
+            source: Path to XML file, or callable opening a binary stream
+            file_size: Optional file size, if already known
+        """
+        if LET is None:
+            with self._open_source(source) as f:
+                return ET.parse(f, forbid_dtd=True)
+        
+        parser = self._get_xml_parser()
+        try:
+            with self._open_source(source) as f:
+                if isinstance(source, str) and file_size is None:
+                    file_size = os.fstat(f.fileno()).st_size
+                if isinstance(source, str) and file_size > XML_MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        tree = LET.fromstring(mapped, parser).getroottree()
+                else:
+                    tree = LET.parse(f, parser=parser)
+        except Exception:
+            # Don't carry state from a failed document into the next one
+            self._xml_parser = None
+            raise
+        _reject_dtd(tree)
+        return tree
+
+    def _get_xml_parser(self):
+        """Get the lxml parser shared by all tree parses of this processor"""
+        if self._xml_parser is None:
+            self._xml_parser = LET.XMLParser(**LXML_PARSER_OPTIONS)
+        return self._xml_parser
+
+    def _parse_with_target(self, source: XMLSource, target):
+        """
+        Feed an XML file through a parser target without building a tree
+        
+        Args:
+            source: Path to XML file, or callable opening a binary stream
+            target: Parser target implementing start/end/data/close callbacks
+            
+        Returns:
+            Result of target.close()
+        """
+        if LET is None:
+            parser = ET.DefusedXMLParser(target=target, forbid_dtd=True)
+        else:
+            parser = LET.XMLParser(target=target, **LXML_PARSER_OPTIONS)
+        
+        with self._open_source(source) as f:
+            for chunk in iter(lambda: f.read(XML_FEED_CHUNK_SIZE), b''):
+                parser.feed(chunk)
+        return parser.close()
+
+    def _open_source(self, source: XMLSource) -> BinaryIO:
+        """Open a file path or stream factory as a binary stream"""
+        if isinstance(source, str):
+            return open(source, 'rb')
+        return source()
+
+    def _extract_fields(self, elem, fields: Dict) -> Dict[str, str]:
+        """Get the text of the first descendant matching each mapped field"""
+        values = {}
+        for xml_key in fields:
+            field_elem = elem.find(f".//{xml_key}")
+            if field_elem is not None:
+                values[xml_key] = field_elem.text
+        return values
+
+    def _build_records(self, columns: Dict[str, List[Optional[str]]], count: int,
+                       fields: Dict, session: Session) -> List[Dict]:
+        """
+        Convert a batch of raw field columns into database records
+        
+        Each column is converted on its own, once per distinct value, since
+        reference data repeats codes and dates heavily across records.
+        
+        Args:
+            columns: Raw text per XML field name, one entry per record
+            count: Number of records in the batch
+            fields: Field mapping configuration
+            session: Database session used for lookups
+        """
+        records = [{} for _ in range(count)]
+        
+        # Process fields according to mapping
+        for xml_key, field_config in fields.items():
+            db_field = field_config['db_field']
+            lookup_config = field_config.get('lookup')
+            
+            if not lookup_config:
+                # Regular field conversion, one column at a time
+                values = convert_column(columns[xml_key], field_config['type'], field_config.get('format'))
+                for data, result in zip(records, values):
+                    if result is not None:
+                        data[db_field] = result
+                continue
+            
+            converted = {}
+            for data, field_text in zip(records, columns[xml_key]):
+                if not field_text:
+                    continue
+                
+                if field_text in converted:
+                    result = converted[field_text]
+                else:
+                    value = field_text.strip()
+                    result = self._perform_lookup(
+                        session,
+                        lookup_config['table'],
+                        lookup_config['query'],
+                        value
+                    )
+                    if result is None:
+                        self.logger.warning(
+                            f"No matching record found in {lookup_config['table']} "
+                            f"for value: {value} - setting to NULL"
+                        )
+                    converted[field_text] = result
+                
+                # Set lookup value to None if lookup fails (instead of raising error)
+                data[db_field] = result
+        
+        # Add timestamps
+        now = datetime.utcnow()
+        for data in records:
+            if 'created' not in data:
+                data['created'] = now
+            if 'modified' not in data:
+                data['modified'] = now
+        
+        return records
+
+    def _process_json_file(self, file_path: str, mapping: Dict, session: Session,
+                           source: Optional[XMLSource] = None):
         """Process JSON reference file"""
+        source = file_path if source is None else source
         try:
             self.logger.info(f"Processing JSON file: {file_path}")
             
             # Read JSON file
-            with open(file_path) as f:
+            with self._open_source(source) as f:
                 records = json.load(f)
             
             # Handle both single record and array
@@ -18,6 +18,11 @@ from .cli.display import create_display
 from .utils.db_session import get_db_session
 
 
+def make_scratch_dir() -> tempfile.TemporaryDirectory:
+    """Create a temporary working directory, in ETL_SCRATCH_DIR (e.g. a tmpfs) if configured"""
+    scratch_root = os.getenv('ETL_SCRATCH_DIR')
+    return tempfile.TemporaryDirectory(dir=scratch_root if scratch_root and os.path.isdir(scratch_root) else None)
+
 def setup_logging(debug: bool = False):
     """Setup logging configuration"""
     # Create logs directory in app root
@@ -185,7 +190,7 @@ async def run_cron():
                 return
             
             # Process first valid email
-            with tempfile.TemporaryDirectory() as temp_dir:
+            with make_scratch_dir() as temp_dir:
                 for email in emails:
                     try:
                         # Get and process email
@@ -244,7 +249,7 @@ async def run_interactive(days: Optional[int] = None, import_type: Optional[str]
                     selected['import_type']
                 )
                 
-                with tempfile.TemporaryDirectory() as temp_dir:
+                with make_scratch_dir() as temp_dir:
                     await process_email(msg, selected['import_type'], temp_dir, display, force)
             else:
                 display.update('init', 'done', details='No email selected')
@@ -1,22 +1,67 @@
 import os
+import time
 import logging
 import magic
-from typing import Dict, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
 import dns.resolver
 import re
 from imap_tools import MailBox
 from ..config.config_loader import ConfigLoader
 
+# method=result pairs of Authentication-Results (RFC 8601), plus DMARC's action tag
+_AUTH_RESULT_RE = re.compile(r'\b(spf|dkim|dmarc|action)=([\w-]+)')
+# Received-SPF starts with the SPF result (RFC 7208 section 9.1)
+_RECEIVED_SPF_PASS_RE = re.compile(r'\s*pass\b')
+
 class EmailSecurityProcessor:
+    # Verdicts are reused while a listed message is fetched again for processing
+    RESULT_CACHE_TTL = 300
+    RESULT_CACHE_SIZE = 1024
+    
     def __init__(self, config_loader: Optional[ConfigLoader] = None):
         """Initialize the email security processor"""
         self.logger = logging.getLogger(__name__)
         self.config_loader = config_loader
+        self._result_cache: Dict[Tuple, Tuple[float, Dict[str, bool]]] = {}
 
 
-    async def verify_email_security(self, email_msg, import_type: str) -> Dict[str, bool]:
+    async def verify_email_security_batch(self, email_msgs: Iterable, import_type: str,
+                                          folder: Optional[str] = None
+                                          ) -> AsyncIterator[Tuple[Any, Dict[str, bool]]]:
+        """
+        Verify a batch of emails for one import type
+        
+        The security configuration is read once for the whole batch, and a
+        message listed more than once is verified only once when its folder
+        and Message-ID identify it. Messages are consumed one at a time, so a
+        lazy IMAP fetch is never held in memory as a whole.
+        
+        Args:
+            email_msgs: Email messages to verify, e.g. a MailBox.fetch generator
+            import_type: Import type the messages belong to
+            folder: IMAP folder the messages were fetched from
+            
+        Yields:
+            (message, verification results) for each message, in order
+        """
+        security_config = None
+        if self.config_loader:
+            security_config = self.config_loader.get_security_rules(import_type)
+        for msg in email_msgs:
+            yield msg, await self.verify_email_security(msg, import_type, security_config, folder)
+
+    async def verify_email_security(self, email_msg, import_type: str,
+                                    security_config: Optional[Dict] = None,
+                                    folder: Optional[str] = None) -> Dict[str, bool]:
             """
             Verify email security based on import-specific configuration
+            
+            Args:
+                email_msg: Email message
+                import_type: Import type the message belongs to
+                security_config: Security rules already loaded for import_type
+                folder: IMAP folder the message was fetched from; results are
+                    only cached for messages with a known folder and Message-ID
             """
             # Setup logging
             self.logger.info(f"\nStarting email security verification for {import_type}")
@@ -27,8 +72,15 @@ class EmailSecurityProcessor:
                 self.logger.warning("No config loader provided - using default security settings")
                 return {'all_checks': True}
 
+            cache_key = self._result_cache_key(email_msg, import_type, folder)
+            cached = self._result_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None and time.monotonic() < cached[0]:
+                self.logger.info("Reusing security verification results for this message")
+                return dict(cached[1])
+
             # Get security configuration
-            security_config = self.config_loader.get_security_rules(import_type)
+            if security_config is None:
+                security_config = self.config_loader.get_security_rules(import_type)
             required_checks = security_config.get('email_checks', [])
             
             self.logger.info(f"\nSecurity Configuration:")
@@ -54,6 +106,9 @@ class EmailSecurityProcessor:
             self.logger.info(f"\nInitialized checks: {list(results.keys())}")
 
             try:
+                # Parse the shared Authentication-Results header once for all checks
+                auth_verdicts = self._auth_verdicts(email_msg)
+                
                 # Verify sender domain
                 sender_domain = self._extract_domain(email_msg.from_)
                 allowed_domains = security_config.get('allowed_sender_domains', [])
@@ -65,30 +120,30 @@ class EmailSecurityProcessor:
                 # Perform configured email checks
                 if 'spf' in required_checks:
                     self.logger.info("\nChecking SPF...")
-                    results['spf_pass'] = self._verify_spf(email_msg)
+                    results['spf_pass'] = self._verify_spf(email_msg, auth_verdicts)
                     self.logger.info(f"SPF result: {results['spf_pass']}")
                 else:
                     self.logger.info("SPF check not required")
                 
                 if 'dkim' in required_checks:
                     self.logger.info("\nChecking DKIM...")
-                    results['dkim_pass'] = self._verify_dkim(email_msg)
+                    results['dkim_pass'] = self._verify_dkim(email_msg, auth_verdicts)
                     self.logger.info(f"DKIM result: {results['dkim_pass']}")
                 else:
                     self.logger.info("DKIM check not required")
                 
                 if 'dmarc' in required_checks:
                     self.logger.info("\nChecking DMARC...")
-                    results['dmarc_pass'] = self._verify_dmarc(email_msg)
+                    results['dmarc_pass'] = self._verify_dmarc(email_msg, auth_verdicts)
                     self.logger.info(f"DMARC result: {results['dmarc_pass']}")
                 else:
                     self.logger.info("DMARC check not required")
 
                 # Check attachments
                 self.logger.info("\nChecking attachments...")
+                # Only the primary attachment is decoded, during its validation
                 for attachment in email_msg.attachments:
                     self.logger.info(f"Found attachment: {attachment.filename}")
-                    self.logger.info(f"Size: {len(attachment.payload)} bytes")
 
                 results['attachment_valid'] = self._validate_attachments(
                     email_msg,
@@ -109,41 +164,93 @@ class EmailSecurityProcessor:
                 else:
                     self.logger.info("All checks passed successfully")
 
+                if cache_key is not None:
+                    self._cache_results(cache_key, results)
                 return results
 
             except Exception as e:
                 self.logger.error(f"Error in email security verification: {str(e)}", exc_info=True)
                 raise
 
+    def _result_cache_key(self, email_msg, import_type: str, folder: Optional[str]) -> Optional[Tuple]:
+        """
+        Identify a message by import type, IMAP folder, UID and Message-ID
+        
+        UIDs are only unique within a folder and the Message-ID is chosen by
+        the sender, so messages lacking either a folder or a Message-ID are
+        not cached.
+        
+        Returns:
+            Cache key, or None if the message can't be identified reliably
+        """
+        message_ids = tuple(self._header_values(email_msg, 'message-id'))
+        if folder is None or not message_ids:
+            return None
+        return (import_type, folder, email_msg.uid, message_ids)
+
+    def _cache_results(self, cache_key: Tuple, results: Dict[str, bool]):
+        """Cache verification results, evicting expired then oldest entries when full"""
+        now = time.monotonic()
+        if len(self._result_cache) >= self.RESULT_CACHE_SIZE:
+            self._result_cache = {
+                key: entry for key, entry in self._result_cache.items() if entry[0] > now
+            }
+            while len(self._result_cache) >= self.RESULT_CACHE_SIZE:
+                del self._result_cache[next(iter(self._result_cache))]
+        self._result_cache[cache_key] = (now + self.RESULT_CACHE_TTL, dict(results))
+
     def _extract_domain(self, email_address: str) -> str:
         """Extract domain from email address"""
         match = re.search(r'@([\w.-]+)', email_address)
         if match:
             return match.group(1).strip('>')
             return ''
+
+    def _header_values(self, email_msg, name: str) -> List[str]:
+        """
+        Get the non-empty values of a header, lowercased
+        
+        Args:
+            email_msg: Email message
+            name: Lowercase header name
+        """
+        values = email_msg.headers.get(name, [])
+        if isinstance(values, str):
+            values = [values]
+        return [value.lower() for value in values if value]
         
-    def _verify_spf(self, email_msg) -> bool:
+    def _auth_verdicts(self, email_msg) -> Dict[str, Set[str]]:
+        """
+        Collect the results reported per method in Authentication-Results
+        
+        Args:
+            email_msg: Email message
+            
+        Returns:
+            Mapping of method (spf, dkim, dmarc, action) to the results reported for it
+        """
+        verdicts: Dict[str, Set[str]] = {}
+        auth_results = '\n'.join(self._header_values(email_msg, 'authentication-results'))
+        for method, result in _AUTH_RESULT_RE.findall(auth_results):
+            verdicts.setdefault(method, set()).add(result)
+        return verdicts
+
+    def _verify_spf(self, email_msg, auth_verdicts: Optional[Dict[str, Set[str]]] = None) -> bool:
         """Verify SPF record"""
         try:
             # Check Received-SPF header
-            spf_headers = email_msg.headers.get('received-spf', [])
-            if isinstance(spf_headers, str):
-                spf_headers = [spf_headers]
-                
-            for header in spf_headers:
-                if header and 'pass' in header.lower():
+            for header in self._header_values(email_msg, 'received-spf'):
+                if _RECEIVED_SPF_PASS_RE.match(header):
                     self.logger.debug(f"SPF pass found in header: {header}")
                     return True
 
             # Check Authentication-Results header
-            auth_results = email_msg.headers.get('authentication-results', [])
-            if isinstance(auth_results, str):
-                auth_results = [auth_results]
+            if auth_verdicts is None:
+                auth_verdicts = self._auth_verdicts(email_msg)
                 
-            for result in auth_results:
-                if result and 'spf=pass' in result.lower():
-                    self.logger.debug(f"SPF pass found in auth results: {result}")
-                    return True
+            if 'pass' in auth_verdicts.get('spf', ()):
+                self.logger.debug("SPF pass found in auth results")
+                return True
 
             self.logger.warning("No valid SPF pass found in headers")
             return False
@@ -152,27 +259,16 @@ class EmailSecurityProcessor:
             self.logger.error(f"SPF verification error: {str(e)}")
             return False
 
-    def _verify_dkim(self, email_msg) -> bool:
+    def _verify_dkim(self, email_msg, auth_verdicts: Optional[Dict[str, Set[str]]] = None) -> bool:
         """Verify DKIM signature"""
         try:
-            auth_results = email_msg.headers.get('authentication-results', [])
-            if isinstance(auth_results, str):
-                auth_results = [auth_results]
+            if auth_verdicts is None:
+                auth_verdicts = self._auth_verdicts(email_msg)
                 
-            for result in auth_results:
-                if not result:
-                    continue
-                    
-                # Look for DKIM pass in authentication results
-                if 'dkim=pass' in result.lower():
-                    self.logger.debug(f"DKIM pass found: {result}")
-                    return True
-                    
-                # Check for specific DKIM signature verification
-                dkim_parts = re.findall(r'dkim=(\w+)', result.lower())
-                if dkim_parts and 'pass' in dkim_parts:
-                    self.logger.debug(f"DKIM pass found in parts: {dkim_parts}")
-                    return True
+            # Any passing signature is enough
+            if 'pass' in auth_verdicts.get('dkim', ()):
+                self.logger.debug(f"DKIM pass found: {auth_verdicts['dkim']}")
+                return True
 
             self.logger.warning("No valid DKIM signature found")
             return False
@@ -181,27 +277,22 @@ class EmailSecurityProcessor:
             self.logger.error(f"DKIM verification error: {str(e)}")
             return False
 
-    def _verify_dmarc(self, email_msg) -> bool:
+    def _verify_dmarc(self, email_msg, auth_verdicts: Optional[Dict[str, Set[str]]] = None) -> bool:
         """Verify DMARC policy"""
         try:
             # Check Authentication-Results header
-            auth_results = email_msg.headers.get('authentication-results', [])
-            if isinstance(auth_results, str):
-                auth_results = [auth_results]
-                
-            for result in auth_results:
-                if not result:
-                    continue
-                    
-                # Look for DMARC pass
-                if 'dmarc=pass' in result.lower():
-                    self.logger.debug(f"DMARC pass found: {result}")
-                    return True
+            if auth_verdicts is None:
+                auth_verdicts = self._auth_verdicts(email_msg)
                 
-                # Check for action=none which can indicate pass
-                if 'dmarc=none' in result.lower() or 'action=none' in result.lower():
-                    self.logger.debug("DMARC none/action none found - considered valid")
-                    return True
+            dmarc = auth_verdicts.get('dmarc', set())
+            if 'pass' in dmarc:
+                self.logger.debug("DMARC pass found")
+                return True
+            
+            # Check for action=none which can indicate pass
+            if 'none' in dmarc or 'none' in auth_verdicts.get('action', ()):
+                self.logger.debug("DMARC none/action none found - considered valid")
+                return True
 
             self.logger.warning("No valid DMARC result found")
             return False
@@ -282,12 +373,14 @@ class EmailSecurityProcessor:
 
                 # Only validate the primary attachment
                 # Check size
-                if len(primary_attachment.payload) > max_bytes:
+                payload = primary_attachment.payload
+                self.logger.info(f"Primary attachment size: {len(payload)} bytes")
+                if len(payload) > max_bytes:
                     self.logger.warning(f"Primary attachment exceeds max size")
                     return False
 
                 # Check type using python-magic
-                mime_type = magic.from_buffer(primary_attachment.payload, mime=True)
+                mime_type = magic.from_buffer(payload, mime=True)
                 self.logger.debug(f"Primary attachment MIME type: {mime_type}")
                 
                 if mime_type not in allowed_types:
@@ -1,70 +1,241 @@
 import os
+import re
+import sys
+import copy
+import collections
+import mmap
+import zlib
+import socket
+import struct
+import asyncio
 import magic
 import zipfile
 import json
 import logging
-from typing import List, Dict, Optional
+import functools
+import threading
+from xml.parsers import expat
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
 from pathlib import Path
 import defusedxml.ElementTree as ET
+from defusedxml import DTDForbidden, EntitiesForbidden
 from xml.etree.ElementTree import Element
 import clamd
 from ..config.config_loader import ConfigLoader
+from ..utils.file_hash_tracker import file_hash_digest, new_file_hasher
+
+try:
+    from lxml import etree as LET
+except ImportError:
+    LET = None
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the file types this pipeline handles, checked before
+# falling back to libmagic; bytes.startswith matches a tuple in one C call
+_ZIP_SIGNATURES = (
+    b'PK\x03\x04',
+    b'PK\x05\x06',  # empty archive
+    b'PK\x07\x08',  # spanned archive
+)
+_XML_SIGNATURES = (b'<?xml', b'\xef\xbb\xbf<?xml')
+# Bytes read for MIME detection: enough for the signatures above and for
+# libmagic's buffer tests when the signature is not recognized
+_MIME_SNIFF_SIZE = 4096
+
+# MIME types accepted for ZIP attachments
+ZIP_MIME_TYPES = frozenset({'application/zip', 'application/x-zip-compressed'})
+
+# Lexical root ZIP member paths are checked against when not extracting
+_VIRTUAL_ZIP_ROOT = os.path.join(os.sep, 'archive', '')
+
+# Read size used when feeding XML files to the validating parser
+XML_FEED_CHUNK_SIZE = 64 * 1024
 
 class SecureFileProcessor:
     """Handles secure file processing with import-specific validation"""
     
+    # ZIP extraction tuning
+    MAX_EXTRACT_WORKERS = 8
+    COPY_BUFFER_SIZE = 256 * 1024  # one write() syscall per 256 KiB decompressed
+    
+    # Files at least this large are streamed to clamd with sendfile
+    CLAMD_SENDFILE_THRESHOLD = 256 * 1024
+    CLAMD_CHUNK_SIZE = 1024 * 1024
+    MAX_CONCURRENT_SCANS = 4
+    
+    # Detected MIME types, keyed by path, mtime and size so changed files miss
+    MIME_CACHE_SIZE = 4096
+    
+    # Rejection messages of stat'ed files, so retried bad files fail fast
+    REJECTED_CACHE_SIZE = 1024
+    
     def __init__(self, config_loader: Optional[ConfigLoader] = None):
         """Initialize the file security processor"""
-        self.logger = logging.getLogger(__name__)
         self.config_loader = config_loader
+        # One libmagic handle for every file, loaded on first use since most
+        # files are identified from their header; Magic serializes calls with a lock
+        self._magic = None
+        self._cached_mime_type = functools.lru_cache(maxsize=self.MIME_CACHE_SIZE)(self._detect_mime_type)
+        self._rejected_files = collections.OrderedDict()
+        self._rejected_lock = threading.Lock()
+        # lxml parsers are reusable but not thread-safe: one per thread
+        self._xml_parsers = threading.local()
         self.clamd = None
         try:
             self.clamd = clamd.ClamdUnixSocket()
         except Exception as e:
-            self.logger.warning(f"Could not initialize ClamAV: {e}")
+            logger.warning("Could not initialize ClamAV: %s", e)
 
-    def validate_file(self, file_path: str, import_type: str) -> bool:
+    def validate_file(self, file_path: str, import_type: str, file_size: Optional[int] = None) -> bool:
         """
         Validate file according to import-specific rules
         
         Args:
             file_path: Path to file to validate
             import_type: Type of import
+            file_size: Size of the file if already known, e.g. just written;
+                the file is then only stat'ed when its MIME type is needed
         """
         try:
             if not self.config_loader:
-                self.logger.warning("No config loader provided - using default validation")
+                logger.warning("No config loader provided - using default validation")
                 return True
 
-            security_config = self.config_loader.get_security_rules(import_type)
-            file_validation = security_config.get('file_validation', {})
-            
-            # Get file info
-            file_size = os.path.getsize(file_path)
-            mime_type = magic.from_file(file_path, mime=True)
-            file_ext = Path(file_path).suffix.lower()
-            
-            # Convert max_size to bytes
-            max_size = self._parse_size(file_validation.get('max_size', '50MB'))
-            
-            # Check file size
-            if file_size > max_size:
-                raise ValueError(f"File exceeds maximum size of {file_validation['max_size']}")
-            
-            # Explicitly validate ZIP file
-            if file_ext == '.zip':
-                if mime_type not in ['application/zip', 'application/x-zip-compressed']:
-                    raise ValueError(f"Invalid ZIP file MIME type: {mime_type}")
-            
-            # Rest of the validation remains the same
+            error = self._validate_file_inner(file_path, import_type, file_size)
+            if error is not None:
+                raise ValueError(error)
             return True
                 
         except Exception as e:
-            self.logger.error(f"File validation error: {str(e)}")
+            logger.error("File validation error: %s", e)
             raise
 
+    def _validate_file_inner(self, file_path: str, import_type: str,
+                             file_size: Optional[int] = None) -> Optional[str]:
+        """
+        Check a file against import-specific rules without raising for rejections
+        
+        Loops over many files branch on the result instead of setting up an
+        exception per file; I/O errors still raise. A stat'ed file that was
+        rejected before is turned away again without re-checking it while its
+        mtime and size are unchanged.
+        
+        Args:
+            file_path: Path to file to validate
+            import_type: Type of import
+            file_size: Size of the file if already known
+            
+        Returns:
+            Error message if the file is rejected, None if it is valid
+        """
+        # Get file info with at most one stat call
+        file_ext = Path(file_path).suffix.lower()
+        stat = None
+        rejected_key = None
+        if file_size is None or file_ext == '.zip':
+            stat = os.stat(file_path)
+            file_size = stat.st_size
+            rejected_key = (os.path.abspath(file_path), stat.st_mtime_ns, file_size, import_type)
+            with self._rejected_lock:
+                error = self._rejected_files.get(rejected_key)
+                if error is not None:
+                    self._rejected_files.move_to_end(rejected_key)
+                    return error
+        
+        error = self._file_error(file_path, import_type, file_ext, file_size, stat)
+        if error is not None and rejected_key is not None:
+            with self._rejected_lock:
+                self._rejected_files[rejected_key] = error
+                if len(self._rejected_files) > self.REJECTED_CACHE_SIZE:
+                    self._rejected_files.popitem(last=False)
+        return error
+
+    def _file_error(self, file_path: str, import_type: str, file_ext: str, file_size: int,
+                    stat: Optional[os.stat_result]) -> Optional[str]:
+        """
+        Apply import-specific file rules
+        
+        Args:
+            file_path: Path to file to validate
+            import_type: Type of import
+            file_ext: Lowercased file extension
+            file_size: Size of the file
+            stat: Result of os.stat for file_path, required for ZIP files
+            
+        Returns:
+            Error message if the file is rejected, None if it is valid
+        """
+        security_config = self.config_loader.get_security_rules(import_type)
+        file_validation = security_config.get('file_validation', {})
+        
+        # Convert max_size to bytes
+        max_size = self._parse_size(file_validation.get('max_size', '50MB'))
+        
+        # Check file size
+        if file_size > max_size:
+            return f"File exceeds maximum size of {file_validation['max_size']}"
+        
+        # Explicitly validate ZIP file; only ZIPs need a MIME type
+        if file_ext == '.zip':
+            mime_type = self._mime_type(file_path, stat)
+            if mime_type not in ZIP_MIME_TYPES:
+                return f"Invalid ZIP file MIME type: {mime_type}"
+        
+        return None
+
+    def _mime_type(self, file_path: str, stat: os.stat_result) -> str:
+        """
+        Get a file's MIME type, reusing the result while the file is unchanged
+        
+        Args:
+            file_path: Path to file
+            stat: Result of os.stat for file_path
+            
+        Returns:
+            MIME type
+        """
+        return self._cached_mime_type(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+    def _detect_mime_type(self, file_path: str, mtime_ns: int, size: int) -> str:
+        """Detect a file's MIME type; mtime_ns and size only key the cache"""
+        head = self._read_head(file_path)
+        return self._sniff_mime(head) or self._get_magic().from_buffer(head)
+
+    def _get_magic(self) -> magic.Magic:
+        """Get the shared libmagic handle, loading the magic database on first use"""
+        if self._magic is None:
+            self._magic = magic.Magic(mime=True)
+        return self._magic
+
+    def _read_head(self, file_path: str) -> bytes:
+        """Read the leading bytes of a file with a single pread, without a file object"""
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+        try:
+            return os.pread(fd, _MIME_SNIFF_SIZE, 0)
+        finally:
+            os.close(fd)
+
+    def _sniff_mime(self, head: bytes) -> Optional[str]:
+        """
+        Identify a file from its leading bytes
+        
+        Args:
+            head: Leading bytes of the file
+            
+        Returns:
+            MIME type, or None if the header is not a known signature
+        """
+        if head.startswith(_ZIP_SIGNATURES):
+            return 'application/zip'
+        if head.startswith(_XML_SIGNATURES):
+            return 'text/xml'
+        return None
 
-    def secure_extract_zip(self, zip_path: str, extract_dir: str, import_type: str) -> List[str]:
+    def secure_extract_zip(self, zip_path: str, extract_dir: str, import_type: str,
+                           on_extracted: Optional[Callable[[str], None]] = None,
+                           file_hashes: Optional[Dict[str, bytes]] = None) -> List[str]:
             """
             Securely extract ZIP file according to import-specific rules
             
@@ -72,120 +243,500 @@ class SecureFileProcessor:
                 zip_path: Path to ZIP file
                 extract_dir: Directory to extract to
                 import_type: Type of import
+                on_extracted: Optional callback receiving each file path once it
+                    has been extracted and validated (called from worker threads);
+                    XML members are also checked against xml_validation if configured
+                file_hashes: Optional dict filled with each extracted file's
+                    FileHashTracker hash, computed while the file is written
                 
             Returns:
                 List of extracted file paths
             """
             try:
                 security_config = self.config_loader.get_security_rules(import_type)
-                zip_config = security_config.get('file_validation', {}).get('zip_extraction', {})
-                
-                # Log ZIP configuration
-                self.logger.debug(f"ZIP validation config for {import_type}:")
-                self.logger.debug(f"Max ratio: {zip_config.get('max_ratio', 15)}")
-                self.logger.debug(f"Max files: {zip_config.get('max_files', 200)}")
-                self.logger.debug(f"Max file size: {zip_config.get('max_file_size', '50MB')}")
+                xml_config = security_config.get('file_validation', {}).get('xml_validation')
                 
                 with zipfile.ZipFile(zip_path) as zip_ref:
-                    # Check number of files
-                    num_files = len(zip_ref.namelist())
-                    max_files = zip_config.get('max_files', 200)
-                    self.logger.debug(f"Number of files in ZIP: {num_files}")
-                    if num_files > max_files:
-                        raise ValueError(f"ZIP contains too many files (max {max_files})")
-                    
-                    # Check compression ratio
-                    uncompressed_size = sum(info.file_size for info in zip_ref.filelist)
-                    compressed_size = os.path.getsize(zip_path)
-                    max_ratio = zip_config.get('max_ratio', 15)
-                    
-                    self.logger.info(f"ZIP stats for {os.path.basename(zip_path)}:")
-                    self.logger.info(f"Compressed size: {compressed_size:,} bytes")
-                    self.logger.info(f"Uncompressed size: {uncompressed_size:,} bytes")
-                    
-                    if compressed_size > 0:  # Avoid division by zero
-                        ratio = uncompressed_size / compressed_size
-                        self.logger.info(f"Compression ratio: {ratio:.2f}")
-                        if ratio > max_ratio:
-                            raise ValueError(f"Compression ratio too high: {ratio:.2f} (max {max_ratio})")
-            
-                    
-                    # Check individual file sizes
-                    max_file_size = self._parse_size(zip_config['max_file_size'])
-                    for info in zip_ref.filelist:
-                        if info.file_size > max_file_size:
-                            raise ValueError(
-                                f"File {info.filename} exceeds maximum size of {zip_config['max_file_size']}"
-                            )
-                    
-                    # Check for directory traversal
-                    for file_path in zip_ref.namelist():
-                        if file_path.startswith('/') or '..' in file_path:
-                            raise ValueError(f"Potential directory traversal attack in {file_path}")
-                        
-                        # Check file extensions
-                        if not any(file_path.lower().endswith(ext) for ext in zip_config['allowed_types']):
-                            raise ValueError(f"Invalid file type in ZIP: {file_path}")
+                    members = self.check_zip_members(zip_ref, zip_path, import_type, extract_dir)
                     
-                    # Extract and validate each file
-                    extracted_files = []
-                    for file_path in zip_ref.namelist():
-                        # Make the extraction path safe
-                        safe_path = os.path.join(extract_dir, os.path.basename(file_path))
-                        
-                        # Extract file
-                        zip_ref.extract(file_path, extract_dir)
-                        extracted_path = os.path.join(extract_dir, file_path)
-                        
-                        if os.path.isfile(extracted_path):
-                            # Validate extracted file
-                            self.validate_file(extracted_path, import_type)
-                            extracted_files.append(extracted_path)
+                    # Create each target directory once, parents first, so workers only write files
+                    for target_dir in sorted({os.path.dirname(target) for _, target in members}, key=len):
+                        os.makedirs(target_dir, exist_ok=True)
+                
+                    def extracted(file_path: str, file_size: int):
+                        error = self._validate_file_inner(file_path, import_type, file_size)
+                        if error is not None:
+                            raise ValueError(error)
+                        if xml_config is not None and file_path.lower().endswith('.xml'):
+                            self._validate_xml(file_path, xml_config)
+                        if on_extracted is not None:
+                            on_extracted(file_path)
                     
-                    return extracted_files
+                    # Extract in parallel (zlib and lxml release the GIL) with the checked
+                    # members, each capped at its declared size, validating each file as it lands
+                    return self._extract_members(zip_ref, members, extracted, file_hashes)
                     
             except Exception as e:
-                self.logger.error(f"ZIP extraction error: {str(e)}")
+                logger.error("ZIP extraction error: %s", e)
                 raise
 
+    def check_zip_members(self, zip_ref: zipfile.ZipFile, zip_path: str, import_type: str,
+                          extract_dir: Optional[str] = None) -> List[Tuple[zipfile.ZipInfo, str]]:
+        """
+        Check a ZIP archive and its members against import-specific rules
+        
+        Everything is decided from the central directory, so a bomb or unsafe
+        name is rejected before anything is inflated.
+        
+        Args:
+            zip_ref: Open archive
+            zip_path: Path to the archive
+            import_type: Type of import
+            extract_dir: Directory members would be extracted to; if None,
+                member paths are checked against a virtual root
+            
+        Returns:
+            (member, target path) pairs for every member, where the target is
+            the normalized member path under extract_dir, or relative if None
+        """
+        security_config = self.config_loader.get_security_rules(import_type)
+        zip_config = security_config.get('file_validation', {}).get('zip_extraction', {})
+        
+        # Log ZIP configuration
+        logger.debug("ZIP validation config for %s:", import_type)
+        logger.debug("Max ratio: %s", zip_config.get('max_ratio', 15))
+        logger.debug("Max member ratio: %s", zip_config.get('max_member_ratio', 100))
+        logger.debug("Max files: %s", zip_config.get('max_files', 200))
+        logger.debug("Max file size: %s", zip_config.get('max_file_size', '50MB'))
+        logger.debug("Max total size: %s", zip_config.get('max_total_size', '1GB'))
+        
+        # Read the central directory listing once for all checks
+        infos = zip_ref.infolist()
+        
+        # Check number of files
+        num_files = len(infos)
+        max_files = zip_config.get('max_files', 200)
+        logger.debug("Number of files in ZIP: %d", num_files)
+        if num_files > max_files:
+            raise ValueError(f"ZIP contains too many files (max {max_files})")
+        
+        # Check compression ratio
+        uncompressed_size = sum(info.file_size for info in infos)
+        compressed_size = os.path.getsize(zip_path)
+        max_ratio = zip_config.get('max_ratio', 15)
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("ZIP stats for %s:", os.path.basename(zip_path))
+            logger.info("Compressed size: %s bytes", f"{compressed_size:,}")
+            logger.info("Uncompressed size: %s bytes", f"{uncompressed_size:,}")
+        
+        if compressed_size > 0:  # Avoid division by zero
+            ratio = uncompressed_size / compressed_size
+            logger.info("Compression ratio: %.2f", ratio)
+            if ratio > max_ratio:
+                raise ValueError(f"Compression ratio too high: {ratio:.2f} (max {max_ratio})")
+        
+        # Check total size
+        max_total_size = self._parse_size(zip_config.get('max_total_size', '1GB'))
+        if uncompressed_size > max_total_size:
+            raise ValueError(
+                f"ZIP content exceeds maximum total size of {zip_config.get('max_total_size', '1GB')}"
+            )
+        
+        # Check each member in one pass over the central directory
+        max_file_size = self._parse_size(zip_config.get('max_file_size', '50MB'))
+        max_member_ratio = zip_config.get('max_member_ratio', 100)
+        allowed_types = tuple(ext.lower() for ext in zip_config['allowed_types'])
+        # Resolve the extraction root once; members are then checked lexically.
+        # The root ends with a separator, so member paths are appended to it
+        # directly, and path helpers are bound once for the loop
+        if extract_dir is not None:
+            extract_root = os.path.join(os.path.realpath(extract_dir), '')
+        else:
+            extract_root = _VIRTUAL_ZIP_ROOT
+        normpath, isabs = os.path.normpath, os.path.isabs
+        members = []
+        target_files = set()
+        for info in infos:
+            file_path = info.filename
+            file_size = info.file_size
+            compress_size = info.compress_size
+            if file_size > max_file_size:
+                raise ValueError(
+                    f"File {file_path} exceeds maximum size of {zip_config.get('max_file_size', '50MB')}"
+                )
+            # A member claiming content but no stored bytes has a forged header
+            if file_size and not compress_size:
+                raise ValueError(f"Invalid compressed size for {file_path}")
+            if file_size > max_member_ratio * compress_size:
+                raise ValueError(f"Potential zip bomb detected in {file_path}")
+            
+            # Check for directory traversal
+            if isabs(file_path):
+                raise ValueError(f"Potential directory traversal attack in {file_path}")
+            target_path = normpath(extract_root + file_path)
+            if not target_path.startswith(extract_root):
+                raise ValueError(f"Potential directory traversal attack in {file_path}")
+            
+            # Check file extensions
+            if not file_path.lower().endswith(allowed_types):
+                raise ValueError(f"Invalid file type in ZIP: {file_path}")
+            
+            # Two members sharing one path would race when extracted in parallel
+            if target_path in target_files:
+                raise ValueError(f"Duplicate file in ZIP: {file_path}")
+            target_files.add(target_path)
+            # Hand out the normalized path that was checked, under the caller's directory
+            relative_path = target_path[len(extract_root):]
+            members.append(
+                (info, os.path.join(extract_dir, relative_path) if extract_dir is not None else relative_path)
+            )
+        
+        return members
+
+    async def secure_extract_zip_async(self, zip_path: str, extract_dir: str, import_type: str) -> asyncio.Queue:
+        """
+        Securely extract ZIP file in a worker thread, without blocking the event loop
+        
+        Files are queued as soon as they are extracted and validated, so callers
+        can start processing them while the rest of the archive is extracted.
+        
+        Args:
+            zip_path: Path to ZIP file
+            extract_dir: Directory to extract to
+            import_type: Type of import
+            
+        Returns:
+            Queue receiving each extracted file path, then None once extraction
+            is complete, or the exception if extraction failed or was cancelled
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        
+        def on_extracted(file_path: str):
+            loop.call_soon_threadsafe(queue.put_nowait, file_path)
+        
+        def finished(future: asyncio.Future):
+            # A cancelled extraction is incomplete: never report it as finished
+            error = asyncio.CancelledError() if future.cancelled() else future.exception()
+            queue.put_nowait(error)
+        
+        future = loop.run_in_executor(
+            None, self.secure_extract_zip, zip_path, extract_dir, import_type, on_extracted
+        )
+        future.add_done_callback(finished)
+        return queue
+
+    def _extract_members(self, zip_ref: zipfile.ZipFile, members: List[Tuple[zipfile.ZipInfo, str]],
+                         on_extracted: Optional[Callable[[str, int], None]] = None,
+                         file_hashes: Optional[Dict[str, bytes]] = None) -> List[str]:
+        """
+        Extract ZIP members concurrently
+        
+        ZipFile is not thread-safe, so each worker thread opens its own handle
+        on the archive, reused for all members it extracts and closed once the
+        pool is done; members are read with the ZipInfo entries the caller
+        already checked. Each worker thread also keeps a reusable copy buffer.
+        Decompression aborts as soon as a member outgrows its declared size.
+        Stored (uncompressed) members are written straight from a shared
+        read-only map of the archive in a single write, after their CRC-32
+        is checked.
+        
+        Args:
+            zip_ref: Open archive, opened by path; only read to locate the file
+                and to map it for stored members
+            members: (member, target path) pairs to extract; files only, with
+                checked target paths whose parent directories exist
+            on_extracted: Optional callback run in the worker with each extracted
+                file's path and size
+            file_hashes: Optional dict receiving each extracted file's hash
+            
+        Returns:
+            List of extracted file paths, in archive order
+        """
+        if not members:
+            return []
+        
+        local = threading.local()
+        worker_zips: List[zipfile.ZipFile] = []
+        # Every member is about to be read: start readahead of the whole archive
+        archive_fd = zip_ref.fp.fileno()
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(archive_fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        mapped = None
+        if any(info.compress_type == zipfile.ZIP_STORED for info, _ in members):
+            mapped = mmap.mmap(archive_fd, 0, access=mmap.ACCESS_READ)
+        
+        def extract(member: Tuple[zipfile.ZipInfo, str]) -> str:
+            info, target_path = member
+            file_hash = new_file_hasher() if file_hashes is not None else None
+            
+            span = self._stored_span(mapped, info) if mapped is not None else None
+            if span is not None:
+                with open(target_path, 'wb') as dst:
+                    file_size = self._write_stored(mapped, span, dst, info, file_hash)
+            else:
+                buffer = getattr(local, 'buffer', None)
+                if buffer is None:
+                    buffer = local.buffer = bytearray(self.COPY_BUFFER_SIZE)
+                worker_zip = getattr(local, 'zip_ref', None)
+                if worker_zip is None:
+                    worker_zip = local.zip_ref = zipfile.ZipFile(zip_ref.filename)
+                    worker_zips.append(worker_zip)
+                with worker_zip.open(info) as src, \
+                        open(target_path, 'wb', buffering=self.COPY_BUFFER_SIZE) as dst:
+                    file_size = self._copy_stream(
+                        src, dst, buffer, limit=info.file_size, file_hash=file_hash
+                    )
+            if file_hash is not None:
+                file_hashes[target_path] = file_hash_digest(file_hash)
+            if on_extracted is not None:
+                on_extracted(target_path, file_size)
+            return target_path
+        
+        max_workers = min(self.MAX_EXTRACT_WORKERS, os.cpu_count() or 1, len(members))
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(extract, members))
+        finally:
+            for worker_zip in worker_zips:
+                worker_zip.close()
+            if mapped is not None:
+                mapped.close()
+
+    def _stored_span(self, mapped: mmap.mmap, info: zipfile.ZipInfo) -> Optional[Tuple[int, int]]:
+        """
+        Locate a stored member's data in the mapped archive
+        
+        Args:
+            mapped: Read-only map of the whole archive
+            info: Member to locate
+            
+        Returns:
+            (start, end) offsets of the member data, or None if the member is
+            compressed, encrypted or inconsistent and must go through zipfile
+        """
+        if (info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1
+                or info.compress_size != info.file_size):
+            return None
+        
+        # Local file header: signature, flags and method at offset 6, then name
+        # and extra field lengths at offset 26
+        header_end = info.header_offset + 30
+        if header_end > len(mapped) or mapped[info.header_offset:info.header_offset + 4] != b'PK\x03\x04':
+            return None
+        flag_bits, compress_type = struct.unpack('<HH', mapped[info.header_offset + 6:info.header_offset + 10])
+        name_length, extra_length = struct.unpack('<HH', mapped[header_end - 4:header_end])
+        
+        # The local header must agree with the central directory, as zipfile
+        # requires; otherwise let zipfile reject the member
+        if compress_type != zipfile.ZIP_STORED or flag_bits & 0x1:
+            return None
+        name = mapped[header_end:header_end + name_length]
+        try:
+            name = name.decode('utf-8' if flag_bits & 0x800 else 'cp437')
+        except UnicodeDecodeError:
+            return None
+        if name != info.orig_filename:
+            return None
+        
+        start = header_end + name_length + extra_length
+        end = start + info.file_size
+        if end > len(mapped):
+            return None
+        return start, end
+
+    def _write_stored(self, mapped: mmap.mmap, span: Tuple[int, int], dst, info: zipfile.ZipInfo,
+                      file_hash=None) -> int:
+        """
+        Write a stored member from the mapped archive without copying it through Python
+        
+        Args:
+            mapped: Read-only map of the whole archive
+            span: (start, end) offsets of the member data
+            dst: Writable binary stream
+            info: Member being written
+            file_hash: Optional hash object updated with the member data
+            
+        Returns:
+            Number of bytes written
+        """
+        start, end = span
+        with memoryview(mapped) as archive_view, archive_view[start:end] as data:
+            if zlib.crc32(data) != info.CRC:
+                raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+            if file_hash is not None:
+                file_hash.update(data)
+            dst.write(data)
+        return end - start
+
+    def _copy_stream(self, src, dst, buffer: bytearray, limit: Optional[int] = None,
+                     file_hash=None) -> int:
+        """
+        Copy a binary stream through a caller-owned buffer
+        
+        Args:
+            src: Readable binary stream
+            dst: Writable binary stream
+            buffer: Reusable buffer, so no chunk allocation happens per read
+            limit: Optional maximum number of bytes to copy
+            file_hash: Optional hash object updated with the copied bytes
+            
+        Returns:
+            Number of bytes copied
+        """
+        view = memoryview(buffer)
+        total = 0
+        try:
+            while True:
+                n = src.readinto(buffer)
+                if not n:
+                    return total
+                total += n
+                if limit is not None and total > limit:
+                    raise ValueError(f"Decompressed data exceeds limit of {limit} bytes")
+                if file_hash is not None:
+                    file_hash.update(view[:n])
+                dst.write(view[:n])
+        finally:
+            view.release()
+
     def _validate_xml(self, file_path: str, xml_config: Dict) -> bool:
         """
         Validate XML file
         
+        Without validation rules only well-formedness, depth and DTD policy
+        matter, so the file is parsed from a read-only map by expat and no tree
+        is built. Otherwise, with lxml, libxml2 reads the file into a reused
+        parser that never resolves entities, loads a DTD or touches the network;
+        a declared DTD or entity is then rejected as defusedxml would.
+        
         Args:
             file_path: Path to XML file
             xml_config: XML validation configuration
         """
         try:
-            # Configure parser security options
-            if xml_config.get('disable_entities', True):
-                ET.set_disable_entities()
-            if xml_config.get('disable_dtd', True):
-                ET.set_disable_dtd()
-                
+            disable_entities = xml_config.get('disable_entities', True)
+            disable_dtd = xml_config.get('disable_dtd', True)
+            max_depth = xml_config.get('max_depth', 100)
+            
+            # Get validation rules
+            rules = xml_config.get('validation_rules', {})
+            if not rules:
+                self._check_xml_stream(file_path, max_depth, disable_dtd, disable_entities)
+                return True
+            
             # Parse XML
-            tree = ET.parse(file_path)
+            if LET is None:
+                tree = ET.parse(file_path, forbid_dtd=disable_dtd, forbid_entities=disable_entities)
+            else:
+                parser = self._get_xml_parser(resolve_entities=not disable_entities)
+                try:
+                    # libxml2 reads the file itself, without Python-side buffers
+                    tree = LET.parse(file_path, parser)
+                except Exception:
+                    # Don't carry state from a failed document into the next one
+                    self._drop_xml_parser(resolve_entities=not disable_entities)
+                    raise
+                self._check_doctype(tree, disable_dtd, disable_entities)
             
             # Check depth
-            max_depth = xml_config.get('max_depth', 100)
             depth = self._get_xml_depth(tree.getroot())
             
             if depth > max_depth:
                 raise ValueError(f"XML depth exceeds maximum of {max_depth}")
             
-            # Get validation rules
-            rules = xml_config.get('validation_rules', {})
-            
             # Validate against rules
-            if rules:
-                self._validate_xml_rules(tree.getroot(), rules)
+            self._validate_xml_rules(tree.getroot(), rules)
             
             return True
             
         except Exception as e:
-            self.logger.error(f"XML validation error: {str(e)}")
+            logger.error("XML validation error: %s", e)
             raise
 
+    def _check_xml_stream(self, file_path: str, max_depth: int, disable_dtd: bool, disable_entities: bool):
+        """
+        Check XML well-formedness, depth and DTD policy with expat, without building a tree
+        
+        Args:
+            file_path: Path to XML file
+            max_depth: Maximum element nesting depth
+            disable_dtd: Reject documents declaring a DTD
+            disable_entities: Reject documents declaring entities
+        """
+        parser = expat.ParserCreate()
+        depth = 0
+        
+        def start_element(name, attrs):
+            nonlocal depth
+            depth += 1
+            if depth > max_depth:
+                raise ValueError(f"XML depth exceeds maximum of {max_depth}")
+        
+        def end_element(name):
+            nonlocal depth
+            depth -= 1
+        
+        def start_doctype(name, sysid, pubid, has_internal_subset):
+            raise DTDForbidden(name, sysid, pubid)
+        
+        def entity_decl(name, is_parameter_entity, value, base, sysid, pubid, notation_name):
+            raise EntitiesForbidden(name, value, base, sysid, pubid, notation_name)
+        
+        def unparsed_entity_decl(name, base, sysid, pubid, notation_name):
+            raise EntitiesForbidden(name, None, base, sysid, pubid, notation_name)
+        
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        if disable_dtd:
+            parser.StartDoctypeDeclHandler = start_doctype
+        if disable_entities:
+            parser.EntityDeclHandler = entity_decl
+            parser.UnparsedEntityDeclHandler = unparsed_entity_decl
+        
+        with open(file_path, 'rb', buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            # expat parses straight from a read-only map of the file; empty files
+            # can't be mapped and files beyond the address space are read in chunks
+            if 0 < size <= sys.maxsize:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    parser.Parse(mapped, True)
+                return
+            for chunk in iter(lambda: f.read(XML_FEED_CHUNK_SIZE), b''):
+                parser.Parse(chunk, False)
+        parser.Parse(b'', True)
+
+    def _get_xml_parser(self, resolve_entities: bool):
+        """Get this thread's hardened lxml parser for the given entity setting"""
+        name = 'resolving' if resolve_entities else 'literal'
+        parser = getattr(self._xml_parsers, name, None)
+        if parser is None:
+            parser = LET.XMLParser(
+                resolve_entities=resolve_entities,
+                no_network=True,
+                load_dtd=False,
+                huge_tree=False
+            )
+            setattr(self._xml_parsers, name, parser)
+        return parser
+
+    def _drop_xml_parser(self, resolve_entities: bool):
+        """Discard this thread's lxml parser for the given entity setting"""
+        self._xml_parsers.__dict__.pop('resolving' if resolve_entities else 'literal', None)
+
+    def _check_doctype(self, tree, disable_dtd: bool, disable_entities: bool):
+        """Raise defusedxml's errors for a forbidden DTD or entity declaration"""
+        docinfo = tree.docinfo
+        if not docinfo.doctype:
+            return
+        if disable_dtd:
+            raise DTDForbidden(docinfo.root_name, docinfo.system_url, docinfo.public_id)
+        dtd = docinfo.internalDTD
+        if disable_entities and dtd is not None:
+            for entity in dtd.iterentities():
+                raise EntitiesForbidden(entity.name, entity.content, None, entity.system_url, None, None)
+
     def _validate_json(self, file_path: str, json_config: Dict) -> bool:
         """
         Validate JSON file
@@ -220,7 +771,7 @@ class SecureFileProcessor:
             return True
             
         except Exception as e:
-            self.logger.error(f"JSON validation error: {str(e)}")
+            logger.error("JSON validation error: %s", e)
             raise
 
     def _validate_xml_rules(self, element: Element, rules: Dict):
@@ -300,33 +851,111 @@ class SecureFileProcessor:
             )
         return current_depth
 
-    def _scan_file(self, file_path: str) -> bool:
+    async def scan_files(self, file_paths: List[str]) -> Dict[str, bool]:
+        """
+        Scan several files for malware concurrently
+        
+        clamd runs each INSTREAM session on its own thread, so up to
+        MAX_CONCURRENT_SCANS files are streamed at once. A clamd client keeps
+        its socket on the instance while a command runs, so every in-flight
+        scan borrows its own client from a small pool.
+        
+        Args:
+            file_paths: Paths of files to scan
+            
+        Returns:
+            Mapping of file path to True if clean, False if malware detected
+        """
+        if not self.clamd:
+            logger.warning("ClamAV not available - skipping malware scan")
+            return {file_path: True for file_path in file_paths}
+        
+        scanners = asyncio.Queue()
+        for _ in range(min(self.MAX_CONCURRENT_SCANS, len(file_paths))):
+            scanners.put_nowait(copy.copy(self.clamd))
+        loop = asyncio.get_running_loop()
+        
+        async def scan(file_path: str) -> bool:
+            scanner = await scanners.get()
+            try:
+                return await loop.run_in_executor(None, self._scan_file, file_path, scanner)
+            finally:
+                scanners.put_nowait(scanner)
+        
+        results = await asyncio.gather(*(scan(file_path) for file_path in file_paths))
+        return dict(zip(file_paths, results))
+
+    def _scan_file(self, file_path: str, scanner=None) -> bool:
         """
         Scan file for malware using ClamAV
         
         Args:
             file_path: Path to file to scan
+            scanner: clamd client to use, defaults to the shared one
             
         Returns:
             True if file is clean, False if malware detected
         """
         try:
-            if not self.clamd:
-                self.logger.warning("ClamAV not available - skipping malware scan")
+            scanner = scanner or self.clamd
+            if not scanner:
+                logger.warning("ClamAV not available - skipping malware scan")
                 return True
                 
             # Scan file
             with open(file_path, 'rb') as f:
-                scan_result = self.clamd.instream(f)
+                file_size = os.fstat(f.fileno()).st_size
+                if file_size >= self.CLAMD_SENDFILE_THRESHOLD and hasattr(scanner, 'unix_socket'):
+                    return self._instream_sendfile(f, file_size, scanner) == 'stream: OK'
+                scan_result = scanner.instream(f)
             
             # Check result
             status = scan_result['stream'][0]
             return status == 'OK'
             
         except Exception as e:
-            self.logger.error(f"Malware scan error: {str(e)}")
+            logger.error("Malware scan error: %s", e)
             return False
 
+    def _instream_sendfile(self, f, file_size: int, scanner=None) -> str:
+        """
+        Send a file to clamd's INSTREAM command without copying it through Python
+        
+        Each chunk's length prefix is written from Python, then the chunk itself
+        is passed from the file to the clamd socket by the kernel (sendfile).
+        
+        Args:
+            f: Open binary file
+            file_size: Size of the file
+            scanner: clamd client whose socket path and timeout are used
+            
+        Returns:
+            Raw clamd response, e.g. 'stream: OK'
+        """
+        scanner = scanner or self.clamd
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(getattr(scanner, 'timeout', None))
+            sock.connect(scanner.unix_socket)
+            sock.sendall(b'zINSTREAM\0')
+            
+            offset = 0
+            while offset < file_size:
+                length = min(self.CLAMD_CHUNK_SIZE, file_size - offset)
+                sock.sendall(struct.pack('!L', length))
+                if sock.sendfile(f, offset, length) != length:
+                    raise IOError("File changed while streaming it to clamd")
+                offset += length
+            sock.sendall(struct.pack('!L', 0))
+            
+            response = b''
+            while not response.endswith(b'\0'):
+                data = sock.recv(4096)
+                if not data:
+                    break
+                response += data
+        
+        return response.rstrip(b'\0').decode('utf-8', 'replace').strip()
+
     def _parse_size(self, size_str: str) -> int:
         """
         Convert size string (e.g., '50MB') to bytes
@@ -385,8 +1014,8 @@ class SecureFileProcessor:
         """
         try:
             with zipfile.ZipFile(file_path) as zip_ref:
-                # Check CRC
-                if zip_config.get('check_crc', True):
+                # Check CRC (off by default: extraction already verifies CRC on read)
+                if zip_config.get('check_crc', False):
                     test_result = zip_ref.testzip()
                     if test_result is not None:
                         raise ValueError(f"CRC check failed for {test_result}")
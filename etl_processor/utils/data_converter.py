@@ -1,13 +1,21 @@
 # etl_processor/utils/data_converter.py
 
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Iterable, List, Optional
 import logging
 from dateutil import parser
 import re
 
 logger = logging.getLogger(__name__)
 
+# Numeric dates dateutil would read as Y-M-D or M-D-Y (its default, month first),
+# with an optional H:M[:S] time; matched in one pass instead of a parser walk
+_NUMERIC_DATE_RE = re.compile(
+    r'(?:(?P<iso_y>\d{4})(?P<iso_sep>[-/.])(?P<iso_m>\d{1,2})(?P=iso_sep)(?P<iso_d>\d{1,2})'
+    r'|(?P<m>\d{1,2})(?P<sep>[-/.])(?P<d>\d{1,2})(?P=sep)(?P<y>\d{4}))'
+    r'(?:[ T](?P<H>\d{1,2}):(?P<M>\d{2})(?::(?P<S>\d{2}))?)?'
+)
+
 def convert_field(value: Any, field_type: str, field_format: Optional[str] = None) -> Any:
     """
     Convert field value based on configuration with enhanced date parsing
@@ -111,6 +119,66 @@ def convert_field(value: Any, field_type: str, field_format: Optional[str] = Non
         logger.error(f"Error converting '{value}' to {field_type}: {str(e)}")
         return None
 
+def convert_column(values: Iterable[Optional[str]], field_type: str, field_format: Optional[str] = None) -> List[Any]:
+    """
+    Convert a column of raw text values sharing one field configuration
+    
+    Reference data repeats codes and dates heavily, so each distinct value
+    is converted once and the result reused for the rest of the column.
+    Array results are copied on reuse so records never share a mutable list.
+    
+    Args:
+        values: Raw text values to convert (None for missing)
+        field_type: Target type for conversion
+        field_format: Optional format specification for parsing
+    
+    Returns:
+        Converted values, None where conversion fails
+    """
+    converted = {}
+    results = []
+    for value in values:
+        if value in converted:
+            result = converted[value]
+            if isinstance(result, list):
+                result = list(result)
+        else:
+            result = converted[value] = convert_field(value, field_type, field_format)
+        results.append(result)
+    return results
+
+def _parse_numeric_datetime(value: str) -> Optional[datetime]:
+    """
+    Parse common numeric date/datetime strings without dateutil
+    
+    Returns None when the value needs the full parser, including when the
+    components are out of range (dateutil may still reinterpret those).
+    """
+    # Canonical ISO dates/datetimes go straight to the C fromisoformat parser
+    if (len(value) == 10 or (len(value) == 19 and value[10] in ' T')) \
+            and value[4] == '-' and value[7] == '-':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    
+    match = _NUMERIC_DATE_RE.fullmatch(value)
+    if not match:
+        return None
+    
+    year, month, day, hour, minute, second = match.group(
+        'iso_y', 'iso_m', 'iso_d', 'H', 'M', 'S'
+    )
+    if year is None:
+        year, month, day = match.group('y', 'm', 'd')
+    try:
+        return datetime(
+            int(year), int(month), int(day),
+            int(hour or 0), int(minute or 0), int(second or 0)
+        )
+    except ValueError:
+        return None
+
 def _parse_flexible_date(value: str) -> datetime.date:
     """
     Parse date with multiple potential formats
@@ -121,6 +189,10 @@ def _parse_flexible_date(value: str) -> datetime.date:
     - MM-DD-YYYY
     - Various separators (-, /, .)
     """
+    parsed = _parse_numeric_datetime(value)
+    if parsed is not None:
+        return parsed.date()
+    
     # Try dateutil parser first (most flexible)
     try:
         return parser.parse(value).date()
@@ -152,6 +224,10 @@ def _parse_flexible_datetime(value: str) -> datetime:
     - ISO format
     - Various date formats with optional time
     """
+    parsed = _parse_numeric_datetime(value)
+    if parsed is not None:
+        return parsed
+    
     # Try dateutil parser first (most flexible)
     try:
         return parser.parse(value)
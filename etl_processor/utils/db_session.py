@@ -47,7 +47,7 @@ def get_db_session(import_type: Optional[str] = None, config_loader = None):
         try:
             port = int(port)
         except (TypeError, ValueError):
-            logger.warning(f"Invalid port value: {port}, using default 3306")
+            logger.warning("Invalid port value: %s, using default 3306", port)
             port = 3306
 
         if not all([host, database, user, password]):
@@ -60,20 +60,21 @@ def get_db_session(import_type: Optional[str] = None, config_loader = None):
             raise ValueError(f"Missing required database configuration: {', '.join(missing)}")
 
         db_url = f"mysql+mysqlconnector://{user}:{password}@{host}:{port}/{database}"
-        logger.debug(f"Creating database connection to {host}:{port}/{database} as {user}")
+        logger.debug("Creating database connection to %s:%s/%s as %s", host, port, database, user)
         
         engine = create_engine(db_url)
         Session = sessionmaker(bind=engine)
         return Session()
 
     except Exception as e:
-        logger.error(f"Error creating database session: {str(e)}")
+        logger.error("Error creating database session: %s", e)
         raise
 
 def save_or_update(session, model_class, record_id, data):
     """Save or update database record"""
     try:
-        record = session.query(model_class).get(record_id)
+        # Session.get checks the identity map before emitting a SELECT
+        record = session.get(model_class, record_id)
         if not record:
             record = model_class(id=record_id)
             session.add(record)
@@ -83,5 +84,5 @@ def save_or_update(session, model_class, record_id, data):
             
         return record
     except Exception as e:
-        logger.error(f"Error saving {model_class.__name__} {record_id}: {str(e)}")
+        logger.error("Error saving %s %s: %s", model_class.__name__, record_id, e)
         raise
\ No newline at end of file
@@ -1,16 +1,60 @@
 # etl_processor/utils/email_utils.py
 
 import os
+import atexit
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import ssl
+import string
+import weakref
+from email.message import EmailMessage
+from email.utils import formataddr, getaddresses
 from datetime import datetime
 import logging
-from typing import List, Optional, Tuple
+from typing import List, Optional, Set, Tuple
 from imap_tools import MailBox
 
 logger = logging.getLogger(__name__)
 
+# Instances whose SMTP connection is closed at exit; weak, so this hook
+# keeps neither the instances nor their connections alive
+_instances: 'weakref.WeakSet[EmailUtils]' = weakref.WeakSet()
+
+@atexit.register
+def _close_instances():
+    """Close the SMTP connections of live EmailUtils instances"""
+    for instance in list(_instances):
+        instance.close()
+
+# Notification body, parsed once; file lists and the error block are pre-rendered
+NOTIFICATION_BODY = string.Template(
+    "BSM Import Processing Report\n"
+    "=========================\n"
+    "\n"
+    "Import Date: ${import_date}\n"
+    "\n"
+    "Reference Files:\n"
+    "---------------\n"
+    "Processed: ${processed_count}\n"
+    "Skipped: ${skipped_count}\n"
+    "\n"
+    "Processed Files:\n"
+    "---------------\n"
+    "${processed_files}"
+    "\n"
+    "Skipped Files:\n"
+    "-------------\n"
+    "${skipped_files}"
+    "\n"
+    "Accidents Data:\n"
+    "--------------\n"
+    "Total Accidents: ${total_accidents}\n"
+    "Total Victims: ${total_victims}\n"
+    "\n"
+    "${errors}"
+    "---\n"
+    "This is an automated message from the BSM Import System"
+)
+
 class EmailUtils:
     def __init__(self):
         # Get SMTP settings
@@ -18,26 +62,39 @@ class EmailUtils:
         self.logger.info("Email configuration:")
         
         self.smtp_host = os.getenv('MAILJET_SMTP')
-        self.logger.info(f"SMTP Host: {self.smtp_host}")
+        self.logger.info("SMTP Host: %s", self.smtp_host)
         
         self.smtp_user = os.getenv('MAILJET_SMTP_USER')
-        self.logger.info(f"SMTP User: {self.smtp_user}")
+        self.logger.info("SMTP User: %s", self.smtp_user)
         
         self.smtp_pass = os.getenv('MAILJET_SMTP_PASS')
         
+        # Implicit TLS (SMTPS) skips the STARTTLS round-trip
+        self.smtp_ssl = os.getenv('MAILJET_SMTP_SSL', '').lower() in ('1', 'true', 'yes')
+        self.logger.info("SMTP implicit TLS: %s", self.smtp_ssl)
+        default_port = 465 if self.smtp_ssl else 587
+        
         try:
-            self.smtp_port = int(os.getenv('MAILJET_SMTP_PORT', '587'))
-            self.logger.info(f"SMTP Port: {self.smtp_port}")
+            self.smtp_port = int(os.getenv('MAILJET_SMTP_PORT', str(default_port)))
+            self.logger.info("SMTP Port: %s", self.smtp_port)
         except (TypeError, ValueError):
-            self.logger.warning("Invalid SMTP port value, using default 587")
-            self.smtp_port = 587
-            self.logger.info(f"SMTP Port: {self.smtp_port}")
+            self.logger.warning("Invalid SMTP port value, using default %s", default_port)
+            self.smtp_port = default_port
+            self.logger.info("SMTP Port: %s", self.smtp_port)
         
         # Get IMAP settings
         self.imap_host = os.getenv('IMAP_HOST')
         self.imap_user = os.getenv('IMAP_USERNAME')
         self.imap_pass = os.getenv('IMAP_PASSWORD')
         
+        # Persistent SMTP connection, opened lazily and closed on close(),
+        # on leaving a with block, or at exit
+        self._smtp: Optional[smtplib.SMTP] = None
+        _instances.add(self)
+        
+        # IMAP folder names, fetched once and refreshed on cache miss
+        self._known_folders: Optional[Set[str]] = None
+        
         self.logger.info("Email configuration initialized")
 
     def _format_email_addresses(self, addresses_str: str) -> Tuple[str, List[str]]:
@@ -53,17 +110,12 @@ class EmailUtils:
         if not addresses_str:
             return '', []
         
-        # Split and clean addresses
-        addresses = [addr.strip() for addr in addresses_str.split(',') if addr.strip()]
+        # Parse RFC 2822 address list (handles quoted names containing commas)
+        parsed = [(name, addr) for name, addr in getaddresses([addresses_str]) if addr]
         
-        # For headers, keep addresses as-is
-        header_str = ', '.join(addresses)
-        
-        # For SMTP, extract pure email if in "Name <email>" format
-        smtp_addrs = [
-            addr.split('<')[1].rstrip('>') if '<' in addr else addr 
-            for addr in addresses
-        ]
+        # For headers, re-serialize each address; for SMTP, keep the bare address
+        header_str = ', '.join(formataddr(pair) for pair in parsed)
+        smtp_addrs = [addr for _, addr in parsed]
         
         return header_str, smtp_addrs
 
@@ -89,75 +141,116 @@ class EmailUtils:
             True if email was sent successfully, False otherwise
         """
         try:
-            msg = MIMEMultipart()
-            msg['Subject'] = f"BSM Import Report - {email_date.strftime('%Y-%m-%d %H:%M')}"
-            msg['From'] = os.getenv('EMAIL_FROM', 'SNOSM <rapport_snosm@ensm.si>')
-
+            from_header = os.getenv('EMAIL_FROM', 'SNOSM <rapport_snosm@ensm.si>')
+            
             # Format email addresses
             to_header, to_addrs = self._format_email_addresses(os.getenv('EMAIL_IMPORTS', ''))
-            msg['To'] = to_header
             
-            self.logger.debug(f"Sending to: {to_header}")
-            
-            # Create email body
-            body = [
-                "BSM Import Processing Report",
-                "=========================",
-                "",
-                f"Import Date: {email_date.strftime('%Y-%m-%d %H:%M')}",
-                "",
-                "Reference Files:",
-                "---------------",
-                f"Processed: {len(processed_files)}",
-                f"Skipped: {len(skipped_files)}",
-                "",
-                "Processed Files:",
-                "---------------",
-                *[f"- {file}" for file in processed_files],
-                "",
-                "Skipped Files:",
-                "-------------",
-                *[f"- {file}" for file in skipped_files],
-                "",
-                "Accidents Data:",
-                "--------------",
-                f"Total Accidents: {total_accidents}",
-                f"Total Victims: {total_victims}",
-                ""
-            ]
+            if not (from_header and to_addrs):
+                self.logger.error("Missing From or To addresses")
+                return False
             
-            if error:
-                body.extend([
-                    "Errors:",
-                    "-------",
-                    error,
-                    ""
-                ])
+            msg = EmailMessage()
+            msg['Subject'] = f"BSM Import Report - {email_date.strftime('%Y-%m-%d %H:%M')}"
+            msg['From'] = from_header
+            msg['To'] = to_header
             
-            body.append("---")
-            body.append("This is an automated message from the BSM Import System")
+            self.logger.debug("Sending to: %s", to_header)
             
-            msg.attach(MIMEText('\n'.join(body), 'plain'))
+            # Create email body
+            import_date = email_date.strftime('%Y-%m-%d %H:%M')
+            msg.set_content(NOTIFICATION_BODY.substitute(
+                import_date=import_date,
+                processed_count=len(processed_files),
+                skipped_count=len(skipped_files),
+                processed_files=''.join(f"- {file}\n" for file in processed_files),
+                skipped_files=''.join(f"- {file}\n" for file in skipped_files),
+                total_accidents=total_accidents,
+                total_victims=total_victims,
+                errors=f"Errors:\n-------\n{error}\n\n" if error else ''
+            ))
             
             self.logger.info("Attempting to send email...")
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                self.logger.debug("Connected to SMTP server")
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_pass)
-                
-                if msg['From'] and to_addrs:
-                    from_addr = msg['From'].split('<')[1].rstrip('>') if '<' in msg['From'] else msg['From']
-                    server.send_message(msg, from_addr=from_addr, to_addrs=to_addrs)
-                    self.logger.info("Email sent successfully")
-                    return True
-                else:
-                    self.logger.error("Missing From or To addresses")
-                    return False
+            # Envelope sender and recipients are taken from the From/To headers
+            self._get_smtp().send_message(msg)
+            self.logger.info("Email sent successfully")
+            return True
             
         except Exception as e:
-            self.logger.error(f"Failed to send import notification: {str(e)}", exc_info=True)
+            self.logger.error("Failed to send import notification: %s", e, exc_info=True)
+            # Drop the connection so the next notification starts from a clean session
+            self.close()
             return False
 
+    def _get_smtp(self) -> smtplib.SMTP:
+        """
+        Get an authenticated SMTP connection, reusing the existing one if still alive
+        
+        Returns:
+            Connected and authenticated SMTP client
+        """
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                self.logger.debug("SMTP connection lost, reconnecting")
+            self.close()
+        
+        if self.smtp_ssl:
+            server = smtplib.SMTP_SSL(
+                self.smtp_host, self.smtp_port, context=ssl.create_default_context()
+            )
+            self.logger.debug("Connected to SMTP server over implicit TLS")
+        else:
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+            self.logger.debug("Connected to SMTP server")
+        try:
+            if not self.smtp_ssl:
+                server.starttls()
+            server.login(self.smtp_user, self.smtp_pass)
+        except Exception:
+            # Not yet stored on self, so close() could not reach it later
+            server.close()
+            raise
+        self._smtp = server
+        return server
+
+    def __enter__(self) -> 'EmailUtils':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the persistent SMTP connection if open"""
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        finally:
+            self._smtp = None
+
+    def _folder_exists(self, mailbox: MailBox, folder_name: str) -> bool:
+        """
+        Check folder existence against the cached IMAP folder list
+        
+        The folder list is only fetched from the server on first use or
+        when the requested folder is not in the cached list.
+        
+        Args:
+            mailbox: Logged-in mailbox
+            folder_name: Folder name to look up
+            
+        Returns:
+            True if the folder exists on the server
+        """
+        if self._known_folders is None or folder_name not in self._known_folders:
+            self._known_folders = {f.name for f in mailbox.folder.list()}
+        return folder_name in self._known_folders
+
     async def move_to_archive(self, email_msg, source_folder: str) -> bool:
         """
         Move email to Archive BSM folder
@@ -179,22 +272,23 @@ class EmailUtils:
             
             with MailBox(self.imap_host).login(self.imap_user, self.imap_pass) as mailbox:
                 # Check if archive folder exists
-                folders = [f.name for f in mailbox.folder.list()]
-                if archive_folder not in folders:
-                    self.logger.error(f"Archive folder {archive_folder} not found")
+                if not self._folder_exists(mailbox, archive_folder):
+                    self.logger.error("Archive folder %s not found", archive_folder)
                     return False
                 
                 try:
                     # Set source folder and move message
                     mailbox.folder.set(source_folder)
                     mailbox.move(email_msg.uid, archive_folder)
-                    self.logger.info(f"Email {email_msg.uid} moved to {archive_folder}")
+                    self.logger.info("Email %s moved to %s", email_msg.uid, archive_folder)
                     return True
                     
                 except Exception as move_error:
-                    self.logger.error(f"Failed to move email: {str(move_error)}")
+                    # Folder may have been renamed or removed since it was cached
+                    self._known_folders = None
+                    self.logger.error("Failed to move email: %s", move_error)
                     return False
                     
         except Exception as e:
-            self.logger.error(f"Failed to move email to archive: {str(e)}")
+            self.logger.error("Failed to move email to archive: %s", e)
             return False
\ No newline at end of file
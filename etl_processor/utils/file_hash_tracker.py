@@ -1,14 +1,92 @@
 import os
+import re
+import mmap
 import json
+import fnmatch
 import hashlib
 import logging
-from typing import Dict, Optional
-from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# Prefix marking BLAKE3 digests, so cached SHA-256 digests never compare equal.
+# Digests are raw bytes in memory and hex strings in the cache file.
+BLAKE3_PREFIX = 'blake3:'
+_BLAKE3_DIGEST_PREFIX = BLAKE3_PREFIX.encode('ascii')
 
 def get_app_root():
     """Get the application root directory"""
     return '/var/www/html'
 
+def _dumps(data: Dict[str, str]) -> bytes:
+    """Serialize hash cache to JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+def _loads(raw: bytes) -> Dict[str, str]:
+    """Deserialize hash cache from JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _encode_file_hash(digest: bytes) -> str:
+    """Format a raw file digest as the hex string stored in the cache"""
+    if digest.startswith(_BLAKE3_DIGEST_PREFIX):
+        return BLAKE3_PREFIX + digest[len(_BLAKE3_DIGEST_PREFIX):].hex()
+    return digest.hex()
+
+def _decode_file_hash(value: str) -> bytes:
+    """Parse a cached hex file hash back into a raw digest
+    
+    Raises:
+        ValueError: If value is not a hex digest
+    """
+    if value.startswith(BLAKE3_PREFIX):
+        return _BLAKE3_DIGEST_PREFIX + bytes.fromhex(value[len(BLAKE3_PREFIX):])
+    return bytes.fromhex(value)
+
+def new_file_hasher():
+    """Create a hash object matching FileHashTracker.calculate_file_hash"""
+    if blake3 is not None:
+        return blake3.blake3(max_threads=blake3.blake3.AUTO)
+    return hashlib.sha256()
+
+def file_hash_digest(file_hash) -> bytes:
+    """Get the file digest of a hash object from new_file_hasher"""
+    if blake3 is not None and isinstance(file_hash, blake3.blake3):
+        return _BLAKE3_DIGEST_PREFIX + file_hash.digest()
+    return file_hash.digest()
+
+def _update_mapped(f, file_hash):
+    """Feed an open file to a hash object through a read-only memory map"""
+    fd = f.fileno()
+    # Empty files cannot be memory-mapped
+    if not os.fstat(fd).st_size:
+        return file_hash
+    
+    # Files are read once front to back: ask for aggressive readahead, then
+    # drop the pages afterwards so one-shot data does not crowd the page cache
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        file_hash.update(mapped)
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            mapped.madvise(mmap.MADV_DONTNEED)
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return file_hash
+
 class FileHashTracker:
     """Manages hash tracking for reference data files.
     
@@ -29,6 +107,11 @@ class FileHashTracker:
         '*_reference.json'
     ]
     
+    # All patterns merged into one case-sensitive regex, matching Path.match on POSIX
+    _REFERENCE_FILE_RE = re.compile(
+        '|'.join(fnmatch.translate(pattern) for pattern in REFERENCE_FILE_PATTERNS)
+    )
+    
     def __init__(self, is_cron: bool = False):
         """Initialize FileHashTracker"""
         self.logger = logging.getLogger(__name__)
@@ -37,12 +120,11 @@ class FileHashTracker:
         # Use logs directory in app root
         app_root = '/var/www/html'
         logs_dir = os.path.join(app_root, 'logs')
-        if not os.path.exists(logs_dir):
-            try:
-                os.makedirs(logs_dir)
-            except PermissionError:
-                self.logger.error("Cannot create logs directory. Check permissions.")
-                raise
+        try:
+            os.makedirs(logs_dir, exist_ok=True)
+        except PermissionError:
+            self.logger.error("Cannot create logs directory. Check permissions.")
+            raise
         cache_path = os.path.join(logs_dir, 'reference_file_hashes.json')
         
         self.cache_path = cache_path
@@ -50,51 +132,109 @@ class FileHashTracker:
         
         # Only log in non-cron mode
         if not self.is_cron:
-            self.logger.info(f"Loaded {len(self.file_hashes)} reference file hashes from cache")
-            self.logger.info(f"Initialized hash cache at: {self.cache_path}")
+            self.logger.info("Loaded %s reference file hashes from cache", len(self.file_hashes))
+            self.logger.info("Initialized hash cache at: %s", self.cache_path)
 
-    def _load_hashes(self) -> Dict[str, str]:
-        """Load existing file hashes from cache"""
+    def _load_hashes(self) -> Dict[str, bytes]:
+        """Load existing file hashes from cache.
+        
+        The cache is a log of JSON objects, one per line, where later entries
+        override earlier ones. A cache with many overridden entries, or one in
+        the older single-object format, is compacted after loading.
+        """
         try:
-            if os.path.exists(self.cache_path):
-                with open(self.cache_path, 'r') as f:
-                    return json.load(f)
-        except (IOError, json.JSONDecodeError) as e:
-            self.logger.error(f"Could not load hash cache: {e}")
+            with open(self.cache_path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return {}
+        except IOError as e:
+            self.logger.error("Could not load hash cache: %s", e)
+            return {}
+        
+        try:
+            # Compact caches are a single (possibly pretty-printed) object
+            hashes = _loads(raw) if raw.strip() else {}
+            entries = len(hashes)
+        except ValueError:
+            hashes = {}
+            entries = 0
+            for line in raw.splitlines():
+                try:
+                    entry = _loads(line)
+                except ValueError:
+                    self.logger.warning("Skipping unreadable hash cache entry: %r", line[:100])
+                    continue
+                hashes.update(entry)
+                entries += len(entry)
+        
+        digests = {}
+        for filename, value in hashes.items():
+            try:
+                digests[filename] = _decode_file_hash(value)
+            except (TypeError, ValueError):
+                self.logger.warning("Skipping unreadable hash for %s: %r", filename, value)
         
-        return {}
+        if raw and (not raw.endswith(b'\n') or entries > 2 * len(digests)):
+            self.file_hashes = digests
+            self._save_hashes()
+        return digests
 
     def _save_hashes(self):
-        """Save current file hashes to cache"""
+        """Rewrite the cache as a single compact entry"""
         try:
             os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
             
-            with open(self.cache_path, 'w') as f:
-                json.dump(self.file_hashes, f, indent=2)
-            self.logger.debug(f"Saved hashes: {self.file_hashes}")
+            # Write to a temp file and swap it in so a crash never leaves a truncated cache
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(_dumps(self._encoded_hashes()) + b'\n')
+            os.replace(tmp_path, self.cache_path)
+            self.logger.debug("Saved %s hashes", len(self.file_hashes))
         except IOError as e:
-            self.logger.error(f"Could not save hash cache: {e}")
+            self.logger.error("Could not save hash cache: %s", e)
+
+    def _encoded_hashes(self) -> Dict[str, str]:
+        """Get the hash cache with digests formatted for the cache file"""
+        return {filename: _encode_file_hash(digest) for filename, digest in self.file_hashes.items()}
 
-    def calculate_file_hash(self, file_path: str) -> str:
-        """Calculate SHA-256 hash of file contents"""
+    def _append_hash(self, filename: str, file_hash: bytes):
+        """Append one file hash to the cache with a single O_APPEND write"""
+        try:
+            fd = os.open(self.cache_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, _dumps({filename: _encode_file_hash(file_hash)}) + b'\n')
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.logger.error("Could not save hash cache: %s", e)
+
+    def calculate_file_hash(self, file_path: str) -> bytes:
+        """Calculate a change-detection digest of file contents.
+        
+        Uses multithreaded BLAKE3 over a memory map when the optional blake3
+        package is installed; switching to it makes every cached SHA-256 digest
+        stale once. Otherwise SHA-256 is computed with hashlib.file_digest
+        (Python 3.11+) or over a read-only memory map.
+        """
         try:
             with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
-                return file_hash
+                if blake3 is None and hasattr(hashlib, 'file_digest'):
+                    return hashlib.file_digest(f, 'sha256').digest()
+                return file_hash_digest(_update_mapped(f, new_file_hasher()))
         except IOError as e:
-            self.logger.error(f"Could not read file {file_path}: {e}")
-            return ''
+            self.logger.error("Could not read file %s: %s", file_path, e)
+            return b''
 
     def is_reference_file(self, file_path: str) -> bool:
         """Check if a file is a reference data file based on naming patterns"""
-        filename = Path(file_path).name
-        return any(Path(filename).match(pattern) for pattern in self.REFERENCE_FILE_PATTERNS)
+        return self._REFERENCE_FILE_RE.match(os.path.basename(file_path)) is not None
 
-    def needs_processing(self, file_path: str) -> bool:
+    def needs_processing(self, file_path: str, file_hash: Optional[bytes] = None) -> bool:
         """Check if a reference file needs processing based on its hash.
         
         Args:
             file_path: Path to the reference file to check
+            file_hash: Hash already computed while writing the file, if any
             
         Returns:
             bool: True if file needs processing, False otherwise
@@ -104,44 +244,76 @@ class FileHashTracker:
         """
         if not self.is_reference_file(file_path):
             self.logger.warning(
-                f"Hash tracking attempted on non-reference file: {file_path}. "
-                "Hash tracking should only be used for reference data files."
+                "Hash tracking attempted on non-reference file: %s. "
+                "Hash tracking should only be used for reference data files.",
+                file_path
             )
             # Return True to ensure non-reference files are always processed
             return True
             
-        filename = os.path.basename(file_path)
-        current_hash = self.calculate_file_hash(file_path)
+        return self._has_changed(os.path.basename(file_path), file_path, file_hash)
+
+    def scan_directory(self, dir_path: str) -> List[str]:
+        """Find reference files in a directory that need processing.
+        
+        Walks the directory with a single os.scandir pass; entries that are not
+        reference files are filtered by name without any further syscalls.
+        
+        Args:
+            dir_path: Directory containing reference files
+            
+        Returns:
+            List[str]: Sorted paths of reference files that are new or changed
+        """
+        pending = []
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if not self._REFERENCE_FILE_RE.match(entry.name) or not entry.is_file():
+                    continue
+                if self._has_changed(entry.name, entry.path):
+                    pending.append(entry.path)
+        return sorted(pending)
+
+    def _has_changed(self, filename: str, file_path: str, file_hash: Optional[bytes] = None) -> bool:
+        """Compare a reference file's current hash with the cached one"""
+        current_hash = file_hash or self.calculate_file_hash(file_path)
         
         # Check if file is new or hash has changed
-        needs_proc = filename not in self.file_hashes or self.file_hashes[filename] != current_hash
-        self.logger.info(
-            f"Reference file {filename} needs processing: {needs_proc} "
-            f"(Current hash: {current_hash}, Cached hash: {self.file_hashes.get(filename, 'none')})"
-        )
+        cached_hash = self.file_hashes.get(filename)
+        needs_proc = cached_hash != current_hash
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                "Reference file %s needs processing: %s (Current hash: %s, Cached hash: %s)",
+                filename, needs_proc, _encode_file_hash(current_hash),
+                _encode_file_hash(cached_hash) if cached_hash is not None else 'none'
+            )
         return needs_proc
 
-    def mark_processed(self, file_path: str):
+    def mark_processed(self, file_path: str, file_hash: Optional[bytes] = None):
         """Mark a reference file as processed by storing its hash.
         
         Args:
             file_path: Path to the reference file
+            file_hash: Hash already computed while writing the file, if any
             
         Raises:
             ValueError: If file_path is not a reference data file
         """
         if not self.is_reference_file(file_path):
             self.logger.warning(
-                f"Attempted to mark non-reference file as processed: {file_path}. "
-                "Hash tracking should only be used for reference data files."
+                "Attempted to mark non-reference file as processed: %s. "
+                "Hash tracking should only be used for reference data files.",
+                file_path
             )
             return
             
         filename = os.path.basename(file_path)
-        current_hash = self.calculate_file_hash(file_path)
+        current_hash = file_hash or self.calculate_file_hash(file_path)
         self.file_hashes[filename] = current_hash
-        self._save_hashes()
-        self.logger.info(f"Marked reference file {filename} as processed with hash {current_hash}")
+        self._append_hash(filename, current_hash)
+        self.logger.info(
+            "Marked reference file %s as processed with hash %s", filename, _encode_file_hash(current_hash)
+        )
 
     def clear_cache(self):
         """Clear the hash cache"""
@@ -12,6 +12,7 @@ setup(
         'dnspython>=2.4.0',
         'python-magic>=0.4.27',
         'defusedxml>=0.7.1',
+        'lxml>=4.9.0',
         'clamd>=1.0.2',
         'dkimpy>=1.1.4',
         'imap-tools>=1.0.0',
@@ -3,7 +3,7 @@
 import pytest
 from unittest.mock import patch, MagicMock, call
 from datetime import datetime, date
-from etl_processor.utils.data_converter import convert_field, convert_to_sql_value
+from etl_processor.utils.data_converter import convert_column, convert_field, convert_to_sql_value
 
 def test_error_handling():
     """Test error handling in conversion"""
@@ -41,4 +41,23 @@ def test_error_handling():
         # Test unknown type warning
         result = convert_field("test", "unknown_type")
         assert result == "test"
-        mock_logger.warning.assert_called_with("Unknown field type: unknown_type")
\ No newline at end of file
+        mock_logger.warning.assert_called_with("Unknown field type: unknown_type")
+
+
+def test_convert_column():
+    """Test column conversion converts each distinct value once"""
+    values = ['2025-02-04', None, '2025-02-04', 'not a date', '', '2025-02-04']
+    
+    with patch('etl_processor.utils.data_converter.convert_field', wraps=convert_field) as mock_convert:
+        result = convert_column(values, 'date')
+    
+    assert result == [date(2025, 2, 4), None, date(2025, 2, 4), None, None, date(2025, 2, 4)]
+    assert mock_convert.call_count == 4
+
+
+def test_convert_column_arrays_not_shared():
+    """Test equal array cells convert to distinct lists"""
+    result = convert_column(['a, b', 'a, b'], 'array')
+    
+    assert result == [['a', 'b'], ['a', 'b']]
+    assert result[0] is not result[1]
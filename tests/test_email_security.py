@@ -1,7 +1,7 @@
 # tests/test_email_security.py
 
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, PropertyMock
 import dns.resolver
 from imap_tools import MailBox
 from etl_processor.security.email_security import EmailSecurityProcessor
@@ -110,6 +110,21 @@ async def test_verify_spf_fail(processor, mock_email_msg):
     result = processor._verify_spf(mock_email_msg)
     assert result is False
 
+async def test_verify_spf_result_not_comment(processor, mock_email_msg):
+    """Test only the Received-SPF result counts, not words in its comment"""
+    mock_email_msg.headers['received-spf'] = ['softfail (domain does not designate 1.2.3.4 as permitted; bypassed)']
+    assert processor._verify_spf(mock_email_msg) is False
+
+def test_auth_verdicts(processor, mock_email_msg):
+    """Test all methods are read from Authentication-Results in one pass"""
+    mock_email_msg.headers['authentication-results'] = [
+        'mx.example.com; dkim=fail header.d=a.com; dkim=pass header.d=b.com; spf=pass',
+        'mx.example.com; dmarc=fail (p=none) action=none'
+    ]
+    assert processor._auth_verdicts(mock_email_msg) == {
+        'dkim': {'fail', 'pass'}, 'spf': {'pass'}, 'dmarc': {'fail'}, 'action': {'none'}
+    }
+
 async def test_verify_dkim_pass(processor, mock_email_msg):
     """Test successful DKIM verification"""
     result = processor._verify_dkim(mock_email_msg)
@@ -160,4 +175,73 @@ async def test_verify_email_security_missing_headers(processor, mock_email_msg):
     """Test security verification with missing headers"""
     mock_email_msg.headers = {}
     results = await processor.verify_email_security(mock_email_msg, 'test_import')
-    assert not all(results.values())
\ No newline at end of file
+    assert not all(results.values())
+
+
+async def test_verify_email_security_cached(processor, mock_email_msg):
+    """Test a message verified twice is only checked once"""
+    mock_email_msg.uid = '42'
+    mock_email_msg.headers['message-id'] = ['<42@trusted-domain.com>']
+    mock_email_msg.attachments = []
+    
+    first = await processor.verify_email_security(mock_email_msg, 'test_import', folder='INBOX')
+    second = await processor.verify_email_security(mock_email_msg, 'test_import', folder='INBOX')
+    
+    assert first == second
+    assert processor.config_loader.get_security_rules.call_count == 1
+
+async def test_verify_email_security_cache_keyed_by_folder(processor, mock_email_msg):
+    """Test the same UID in another folder, or without a Message-ID, is verified again"""
+    mock_email_msg.uid = '42'
+    mock_email_msg.headers['message-id'] = ['<42@trusted-domain.com>']
+    mock_email_msg.attachments = []
+    
+    await processor.verify_email_security(mock_email_msg, 'test_import', folder='INBOX')
+    await processor.verify_email_security(mock_email_msg, 'test_import', folder='INBOX.Other')
+    assert processor.config_loader.get_security_rules.call_count == 2
+    
+    del mock_email_msg.headers['message-id']
+    await processor.verify_email_security(mock_email_msg, 'test_import', folder='INBOX')
+    await processor.verify_email_security(mock_email_msg, 'test_import', folder='INBOX')
+    assert processor.config_loader.get_security_rules.call_count == 4
+
+async def test_verify_email_security_cache_expired(processor, mock_email_msg):
+    """Test cached results are not reused once expired"""
+    mock_email_msg.uid = '42'
+    mock_email_msg.headers['message-id'] = ['<42@trusted-domain.com>']
+    mock_email_msg.attachments = []
+    
+    with patch('etl_processor.security.email_security.time.monotonic', side_effect=[0, 1000, 1000]):
+        await processor.verify_email_security(mock_email_msg, 'test_import', folder='INBOX')
+        await processor.verify_email_security(mock_email_msg, 'test_import', folder='INBOX')
+    
+    assert processor.config_loader.get_security_rules.call_count == 2
+
+async def test_verify_email_security_batch(processor, mock_email_msg):
+    """Test a batch reads the security rules once and keeps message order"""
+    trusted = MagicMock(uid='1', from_='sender@trusted-domain.com', subject='a',
+                        headers=mock_email_msg.headers, attachments=[])
+    untrusted = MagicMock(uid='2', from_='sender@evil.com', subject='b',
+                          headers=mock_email_msg.headers, attachments=[])
+    
+    results = [
+        (msg, result) async for msg, result in
+        processor.verify_email_security_batch(iter([trusted, untrusted, trusted]), 'test_import')
+    ]
+    
+    assert [msg for msg, _ in results] == [trusted, untrusted, trusted]
+    assert [r['sender_verified'] for _, r in results] == [True, False, True]
+    assert processor.config_loader.get_security_rules.call_count == 1
+
+async def test_verify_email_security_decodes_primary_only(processor, mock_email_msg):
+    """Test only the primary attachment payload is decoded"""
+    processor.config_loader.get_primary_attachment_filename.return_value = 'test.zip'
+    primary = MagicMock(filename='test.zip', payload=b'PK\x05\x06' + b'\0' * 18)
+    other = MagicMock(filename='photo.jpg')
+    other_payload = PropertyMock(return_value=b'jpeg data')
+    type(other).payload = other_payload
+    mock_email_msg.attachments = [other, primary]
+    
+    await processor.verify_email_security(mock_email_msg, 'test_import')
+    
+    other_payload.assert_not_called()
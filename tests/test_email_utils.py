@@ -2,10 +2,13 @@
 
 import pytest
 import os
+import gc
+import weakref
 import smtplib
 from datetime import datetime
 from unittest.mock import patch, MagicMock, call
 from imap_tools import MailBox
+from etl_processor.utils import email_utils as email_utils_module
 from etl_processor.utils.email_utils import EmailUtils
 
 @pytest.fixture
@@ -46,6 +49,20 @@ def test_data():
         'email_date': datetime(2024, 1, 1, 12, 0)
     }
 
+@pytest.fixture
+def archive_mailbox():
+    """Mock MailBox whose folder list contains the archive folder"""
+    mock_mailbox = MagicMock()
+    mock_mailbox.__enter__ = MagicMock(return_value=mock_mailbox)
+    mock_mailbox.__exit__ = MagicMock(return_value=None)
+    folder_mock = MagicMock()
+    folder_mock.name = 'INBOX.Archive BSM'
+    mock_mailbox.folder.list.return_value = [folder_mock]
+    
+    with patch('etl_processor.utils.email_utils.MailBox') as mock_mb:
+        mock_mb.return_value.login.return_value = mock_mailbox
+        yield mock_mailbox
+
 def test_constructor(mock_env, mock_logger):
     """Test EmailUtils constructor with all values"""
     utils = EmailUtils()
@@ -69,6 +86,11 @@ def test_format_email_addresses(email_utils):
     header, addrs = email_utils._format_email_addresses('Test User <test@test.com>')
     assert header == 'Test User <test@test.com>'
     assert addrs == ['test@test.com']
+    
+    # Quoted display name containing a comma
+    header, addrs = email_utils._format_email_addresses('"Last, First" <first@test.com>, other@test.com')
+    assert header == '"Last, First" <first@test.com>, other@test.com'
+    assert addrs == ['first@test.com', 'other@test.com']
 
 def test_send_notification_success(email_utils, test_data):
     """Test successful email notification"""
@@ -93,9 +115,83 @@ def test_send_notification_with_error(email_utils, test_data):
         result = email_utils.send_import_notification(**test_data)
         assert result is True
         msg = mock_smtp.send_message.call_args[0][0]
-        body = msg.get_payload()[0].get_payload()
+        body = msg.get_content()
         assert 'Test error message' in body
 
+def test_send_notification_reuses_connection(email_utils, test_data):
+    """Test that consecutive notifications share one SMTP session"""
+    mock_smtp = MagicMock()
+    mock_smtp.noop.return_value = (250, b'OK')
+    
+    with patch('smtplib.SMTP', return_value=mock_smtp) as smtp_cls:
+        assert email_utils.send_import_notification(**test_data) is True
+        assert email_utils.send_import_notification(**test_data) is True
+        
+        smtp_cls.assert_called_once()
+        mock_smtp.login.assert_called_once()
+        assert mock_smtp.send_message.call_count == 2
+
+def test_send_notification_reconnects_after_disconnect(email_utils, test_data):
+    """Test that a dropped SMTP session is re-established"""
+    stale_smtp = MagicMock()
+    stale_smtp.noop.side_effect = smtplib.SMTPServerDisconnected()
+    fresh_smtp = MagicMock()
+    
+    with patch('smtplib.SMTP', side_effect=[stale_smtp, fresh_smtp]):
+        assert email_utils.send_import_notification(**test_data) is True
+        assert email_utils.send_import_notification(**test_data) is True
+        
+        fresh_smtp.starttls.assert_called_once()
+        fresh_smtp.login.assert_called_once()
+        fresh_smtp.send_message.assert_called_once()
+
+def test_connection_closed_at_exit_without_keeping_instance(mock_env, test_data):
+    """Test the exit hook closes live connections but holds no strong reference"""
+    mock_smtp = MagicMock()
+    
+    with patch('smtplib.SMTP', return_value=mock_smtp):
+        with EmailUtils() as utils:
+            assert utils.send_import_notification(**test_data) is True
+        mock_smtp.quit.assert_called_once()
+        
+        utils = EmailUtils()
+        utils.send_import_notification(**test_data)
+        email_utils_module._close_instances()
+        assert mock_smtp.quit.call_count == 2
+        
+        instance = weakref.ref(utils)
+        del utils
+        gc.collect()
+        assert instance() is None
+
+def test_send_notification_login_failure_closes_connection(email_utils, test_data):
+    """Test a connection that fails to authenticate is closed, not leaked"""
+    mock_smtp = MagicMock()
+    mock_smtp.login.side_effect = smtplib.SMTPAuthenticationError(535, b'Bad credentials')
+    
+    with patch('smtplib.SMTP', return_value=mock_smtp):
+        assert email_utils.send_import_notification(**test_data) is False
+    
+    mock_smtp.close.assert_called_once()
+    assert email_utils._smtp is None
+
+def test_send_notification_implicit_tls(mock_env, test_data):
+    """Test SMTP_SSL is used without STARTTLS when implicit TLS is enabled"""
+    mock_smtp = MagicMock()
+    
+    with patch.dict(os.environ, {'MAILJET_SMTP_SSL': '1'}):
+        del os.environ['MAILJET_SMTP_PORT']
+        utils = EmailUtils()
+    assert utils.smtp_port == 465
+    
+    with patch('smtplib.SMTP_SSL', return_value=mock_smtp) as smtp_ssl_cls:
+        assert utils.send_import_notification(**test_data) is True
+        
+        smtp_ssl_cls.assert_called_once()
+        mock_smtp.starttls.assert_not_called()
+        mock_smtp.login.assert_called_once()
+        mock_smtp.send_message.assert_called_once()
+
 @pytest.mark.asyncio
 async def test_move_to_archive_success():
     """Test successful archive operation"""
@@ -170,4 +266,38 @@ async def test_move_to_archive_connection_error():
         with patch('imap_tools.MailBox') as mock_mb:
             mock_mb.side_effect = Exception("Connection failed")
             result = await email_utils.move_to_archive(mock_msg, 'INBOX')
-            assert result is False
\ No newline at end of file
+            assert result is False
+@pytest.mark.asyncio
+async def test_move_to_archive_caches_folder_list(mock_env, archive_mailbox):
+    """Test the folder list is fetched once across archive calls"""
+    email_utils = EmailUtils()
+    
+    assert await email_utils.move_to_archive(MagicMock(uid='1'), 'INBOX') is True
+    assert await email_utils.move_to_archive(MagicMock(uid='2'), 'INBOX') is True
+    
+    archive_mailbox.folder.list.assert_called_once()
+    assert archive_mailbox.move.call_count == 2
+
+@pytest.mark.asyncio
+async def test_move_to_archive_refetches_unknown_folder(mock_env, archive_mailbox):
+    """Test a folder missing from the cached list triggers a refetch"""
+    folder_mock = archive_mailbox.folder.list.return_value[0]
+    archive_mailbox.folder.list.side_effect = [[], [folder_mock]]
+    email_utils = EmailUtils()
+    
+    assert await email_utils.move_to_archive(MagicMock(uid='1'), 'INBOX') is False
+    assert await email_utils.move_to_archive(MagicMock(uid='1'), 'INBOX') is True
+    
+    assert archive_mailbox.folder.list.call_count == 2
+
+@pytest.mark.asyncio
+async def test_move_to_archive_failure_resets_folder_cache(mock_env, archive_mailbox):
+    """Test a failed move drops the cached folder list"""
+    archive_mailbox.move.side_effect = [Exception("Move failed"), None]
+    email_utils = EmailUtils()
+    
+    assert await email_utils.move_to_archive(MagicMock(uid='1'), 'INBOX') is False
+    assert email_utils._known_folders is None
+    assert await email_utils.move_to_archive(MagicMock(uid='1'), 'INBOX') is True
+    
+    assert archive_mailbox.folder.list.call_count == 2
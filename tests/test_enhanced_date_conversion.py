@@ -63,4 +63,18 @@ def test_date_conversion_with_specific_format():
     
     for input_val, field_type, field_format, expected in test_cases:
         result = convert_field(input_val, field_type, field_format)
-        assert result == expected, f"Failed for {input_val} with format {field_format}"
\ No newline at end of file
+        assert result == expected, f"Failed for {input_val} with format {field_format}"
+
+
+def test_numeric_date_fast_path_matches_dateutil():
+    """Test numeric dates parsed without dateutil give dateutil's results"""
+    from dateutil import parser
+    values = [
+        '2025-02-04', '2025/2/4', '2025.02.04 15:30', '2025-02-04T15:30:45',
+        '02-04-2025', '2/4/2025 7:05', '12.31.1999 23:59:59',
+        '13-02-2025', '2025-02-04 15:30:45'
+    ]
+    
+    for value in values:
+        assert convert_field(value, 'datetime') == parser.parse(value), f"Mismatch for {value}"
+        assert convert_field(value, 'date') == parser.parse(value).date(), f"Mismatch for {value}"
@@ -1,9 +1,11 @@
 import pytest
 import os
 import json
+import hashlib
 import tempfile
 import logging
 from pathlib import Path
+from unittest.mock import patch
 from etl_processor.utils.file_hash_tracker import FileHashTracker
 
 # Add this fixture to control logging during tests
@@ -85,9 +87,22 @@ def test_calculate_file_hash(temp_dir):
     
     # Same content should produce same hash
     assert hash1 == hash2
-    # Hash should be a non-empty string
-    assert isinstance(hash1, str)
-    assert len(hash1) > 0
+    # Hash should be a raw digest
+    assert isinstance(hash1, bytes)
+    assert len(hash1) >= 32
+
+def test_calculate_file_hash_algorithms(temp_dir):
+    """Test BLAKE3 digests are prefixed and SHA-256 is the fallback"""
+    file_path = os.path.join(temp_dir, 'file.txt')
+    with open(file_path, 'wb') as f:
+        f.write(b"Test content")
+    
+    tracker = FileHashTracker()
+    with patch('etl_processor.utils.file_hash_tracker.blake3', None):
+        assert tracker.calculate_file_hash(file_path) == hashlib.sha256(b"Test content").digest()
+    
+    blake3 = pytest.importorskip('blake3')
+    assert tracker.calculate_file_hash(file_path) == b'blake3:' + blake3.blake3(b"Test content").digest()
 
 def test_needs_processing_for_reference_files(sample_files):
     """Test needs_processing for reference files"""
@@ -122,6 +137,23 @@ def test_needs_processing_for_non_reference_files(sample_files):
     tracker.mark_processed(non_ref_file)
     assert tracker.needs_processing(non_ref_file)
 
+def test_scan_directory(temp_dir, sample_files):
+    """Test bulk scan returns only new or changed reference files"""
+    tracker = FileHashTracker()
+    tracker.clear_cache()
+    
+    # All reference files are new, non-reference files are ignored
+    assert tracker.scan_directory(temp_dir) == sorted(sample_files['ref_files'])
+    
+    # Processed files drop out of the scan until they change
+    for ref_file in sample_files['ref_files']:
+        tracker.mark_processed(ref_file)
+    assert tracker.scan_directory(temp_dir) == []
+    
+    with open(sample_files['ref_files'][0], 'a') as f:
+        f.write("Modified content")
+    assert tracker.scan_directory(temp_dir) == [sample_files['ref_files'][0]]
+
 def test_mark_processed(temp_dir):
     """Test marking files as processed"""
     tracker = FileHashTracker()
@@ -137,13 +169,25 @@ def test_mark_processed(temp_dir):
     # Verify hash was saved
     filename = os.path.basename(ref_file)
     assert filename in tracker.file_hashes
-    assert isinstance(tracker.file_hashes[filename], str)
+    assert isinstance(tracker.file_hashes[filename], bytes)
+    
+    # Verify hash was persisted to the cache file
+    assert FileHashTracker().file_hashes[filename] == tracker.file_hashes[filename]
+
+def test_mark_processed_precomputed_hash(temp_dir):
+    """Test a hash computed during extraction is used without re-reading the file"""
+    tracker = FileHashTracker()
+    ref_file = os.path.join(temp_dir, 'reference_test.xml')
+    with open(ref_file, 'w') as f:
+        f.write("Test content")
+    file_hash = tracker.calculate_file_hash(ref_file)
+    
+    with patch.object(tracker, 'calculate_file_hash') as mock_hash:
+        tracker.mark_processed(ref_file, file_hash)
+        assert not tracker.needs_processing(ref_file, file_hash)
+        mock_hash.assert_not_called()
     
-    # Verify hash was written to cache file
-    with open(tracker.cache_path, 'r') as f:
-        cache_data = json.load(f)
-        assert filename in cache_data
-        assert cache_data[filename] == tracker.file_hashes[filename]
+    assert tracker.file_hashes['reference_test.xml'] == file_hash
 
 def test_clear_cache(temp_dir):
     """Test clearing the hash cache"""
@@ -162,5 +206,28 @@ def test_clear_cache(temp_dir):
     
     # Verify cache is empty
     assert len(tracker.file_hashes) == 0
-    with open(tracker.cache_path, 'r') as f:
-        assert json.load(f) == {}
\ No newline at end of file
+    assert FileHashTracker().file_hashes == {}
+
+def test_load_hashes_log(temp_dir):
+    """Test the cache log is replayed with later entries winning, then compacted"""
+    tracker = FileHashTracker.__new__(FileHashTracker)
+    tracker.logger = logging.getLogger(__name__)
+    tracker.cache_path = os.path.join(temp_dir, 'hashes.json')
+    with open(tracker.cache_path, 'wb') as f:
+        f.write(b'{"a.xml":"01","b.xml":"01"}\n{"a.xml":"02"}\n{"a.xml":"03"}\n{"a.xml":"04"}\n{"a.xml":"05"}\n{"c.xml"')
+    
+    assert tracker._load_hashes() == {'a.xml': b'\x05', 'b.xml': b'\x01'}
+    with open(tracker.cache_path, 'rb') as f:
+        assert json.loads(f.read()) == {'a.xml': '05', 'b.xml': '01'}
+
+def test_hash_cache_format(temp_dir):
+    """Test digests are kept as bytes and stored as hex, BLAKE3 ones prefixed"""
+    tracker = FileHashTracker.__new__(FileHashTracker)
+    tracker.logger = logging.getLogger(__name__)
+    tracker.cache_path = os.path.join(temp_dir, 'hashes.json')
+    tracker.file_hashes = {'a.xml': b'\xab' * 32, 'b.xml': b'blake3:' + b'\xcd' * 32}
+    tracker._save_hashes()
+    
+    with open(tracker.cache_path, 'rb') as f:
+        assert json.loads(f.read()) == {'a.xml': 'ab' * 32, 'b.xml': 'blake3:' + 'cd' * 32}
+    assert tracker._load_hashes() == tracker.file_hashes
@@ -1,18 +1,26 @@
 # tests/test_file_security.py
 
 import pytest
+import io
+import mmap
+import asyncio
 import os
+import socket
+import struct
+import threading
 import zipfile
 import json
 import magic
 from unittest.mock import patch, MagicMock
+from defusedxml import DTDForbidden, EntitiesForbidden
+from xml.parsers import expat
 from pathlib import Path
 from etl_processor.security.file_security import SecureFileProcessor
 
 @pytest.fixture
 def mock_logger():
-    with patch('etl_processor.security.file_security.logging') as mock_log:
-        yield mock_log.getLogger.return_value
+    with patch('etl_processor.security.file_security.logger') as mock_log:
+        yield mock_log
 
 @pytest.fixture
 def sample_config():
@@ -66,10 +74,128 @@ def test_validate_file_too_large(processor, tmp_path):
     with pytest.raises(ValueError, match="exceeds maximum size"):
         processor.validate_file(str(test_file), 'test_import')
 
+def test_validate_file_known_size(processor, tmp_path):
+    """Test a known size is checked without touching the file"""
+    missing = str(tmp_path / "missing.xml")
+    
+    assert processor.validate_file(missing, 'test_import', file_size=1024)
+    with pytest.raises(ValueError, match="exceeds maximum size"):
+        processor.validate_file(missing, 'test_import', file_size=51 * 1024 * 1024)
+
+def test_validate_file_inner_returns_error(processor, tmp_path):
+    """Test rejections are returned as messages instead of raised"""
+    missing = str(tmp_path / "missing.xml")
+    
+    assert processor._validate_file_inner(missing, 'test_import', 1024) is None
+    assert processor._validate_file_inner(
+        missing, 'test_import', 51 * 1024 * 1024
+    ) == "File exceeds maximum size of 50MB"
+
 def test_validate_zip_file(processor, temp_zip):
     """Test ZIP file validation"""
     assert processor.validate_file(temp_zip, 'test_import')
 
+def test_validate_zip_file_bad_mime(processor, tmp_path):
+    """Test a non-ZIP file with a .zip extension is rejected"""
+    fake_zip = tmp_path / "fake.zip"
+    fake_zip.write_text("not a zip archive")
+    
+    with pytest.raises(ValueError, match="Invalid ZIP file MIME type"):
+        processor.validate_file(str(fake_zip), 'test_import')
+
+def test_validate_zip_file_sniffed(processor, temp_zip):
+    """Test ZIP files are recognized from their header without libmagic"""
+    processor._magic = MagicMock()
+    
+    assert processor.validate_file(temp_zip, 'test_import')
+    processor._magic.from_buffer.assert_not_called()
+
+def test_validate_zip_file_sniffed_other_type(processor, tmp_path):
+    """Test a recognized non-ZIP header is rejected without libmagic"""
+    fake_zip = tmp_path / "fake.zip"
+    fake_zip.write_text('<?xml version="1.0"?><root/>')
+    processor._magic = MagicMock()
+    
+    with pytest.raises(ValueError, match="Invalid ZIP file MIME type: text/xml"):
+        processor.validate_file(str(fake_zip), 'test_import')
+    processor._magic.from_buffer.assert_not_called()
+
+def test_validate_zip_file_ambiguous_uses_magic(processor, tmp_path):
+    """Test an unrecognized header is identified by libmagic"""
+    fake_zip = tmp_path / "fake.zip"
+    fake_zip.write_bytes(b'MZ\x90\x00' + bytes(60))
+    processor._magic = MagicMock()
+    processor._magic.from_buffer.return_value = 'application/x-dosexec'
+    
+    with pytest.raises(ValueError, match="Invalid ZIP file MIME type: application/x-dosexec"):
+        processor.validate_file(str(fake_zip), 'test_import')
+    processor._magic.from_buffer.assert_called_once()
+
+def test_mime_type_cached_until_changed(processor, tmp_path):
+    """Test MIME detection is reused until the file's mtime or size changes"""
+    fake_zip = tmp_path / "fake.zip"
+    fake_zip.write_text("not a zip archive")
+    processor._magic = MagicMock()
+    processor._magic.from_buffer.return_value = 'text/plain'
+    
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Invalid ZIP file MIME type"):
+            processor.validate_file(str(fake_zip), 'test_import')
+    assert processor._magic.from_buffer.call_count == 1
+    
+    fake_zip.write_text("still not a zip archive")
+    with pytest.raises(ValueError, match="Invalid ZIP file MIME type"):
+        processor.validate_file(str(fake_zip), 'test_import')
+    assert processor._magic.from_buffer.call_count == 2
+
+def test_validate_file_rejection_cached(processor, tmp_path):
+    """Test a rejected file is turned away without re-checking until it changes"""
+    fake_zip = tmp_path / "fake.zip"
+    fake_zip.write_text("not a zip archive")
+    
+    with pytest.raises(ValueError, match="Invalid ZIP file MIME type"):
+        processor.validate_file(str(fake_zip), 'test_import')
+    with patch.object(processor, '_file_error') as mock_check:
+        with pytest.raises(ValueError, match="Invalid ZIP file MIME type"):
+            processor.validate_file(str(fake_zip), 'test_import')
+    mock_check.assert_not_called()
+    
+    with zipfile.ZipFile(fake_zip, 'w') as zf:
+        zf.writestr('test.xml', '<root/>')
+    assert processor.validate_file(str(fake_zip), 'test_import')
+
+def test_magic_loaded_once_on_demand(processor, tmp_path):
+    """Test the libmagic handle is created on first use and then reused"""
+    fake_zip = tmp_path / "fake.zip"
+    fake_zip.write_text("not a zip archive")
+    
+    with patch('etl_processor.security.file_security.magic.Magic') as mock_magic:
+        mock_magic.return_value.from_buffer.return_value = 'text/plain'
+        assert processor._get_magic() is processor._get_magic()
+        assert processor._detect_mime_type(str(fake_zip), 0, 0) == 'text/plain'
+    
+    mock_magic.assert_called_once_with(mime=True)
+
+def test_sniff_mime(processor, tmp_path):
+    """Test known signatures are recognized and others left to libmagic"""
+    xml_file = tmp_path / "data.xml"
+    xml_file.write_bytes(b'\xef\xbb\xbf<?xml version="1.0"?><root/>')
+    text_file = tmp_path / "notes.txt"
+    text_file.write_text("plain text")
+    
+    assert processor._sniff_mime(processor._read_head(str(xml_file))) == 'text/xml'
+    assert processor._sniff_mime(processor._read_head(str(text_file))) is None
+    assert processor._sniff_mime(b'PK\x05\x06' + bytes(18)) == 'application/zip'
+
+def test_validate_file_skips_magic_for_members(processor, tmp_path):
+    """Test libmagic is only consulted for ZIP files"""
+    test_file = tmp_path / "data.xml"
+    test_file.write_text("<root/>")
+    processor._magic = MagicMock()
+    
+    assert processor.validate_file(str(test_file), 'test_import')
+    processor._magic.from_buffer.assert_not_called()
+
 def test_secure_extract_zip(processor, temp_zip, tmp_path):
     """Test secure ZIP extraction"""
     extract_dir = str(tmp_path / "extracted")
@@ -116,6 +242,69 @@ def test_extract_zip_high_ratio(processor, tmp_path):
     with pytest.raises(ValueError, match="Compression ratio too high"):
         processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
 
+def test_extract_zip_member_bomb(processor, tmp_path):
+    """Test a single over-compressed member is rejected before it is inflated"""
+    zip_path = tmp_path / "member_bomb.zip"
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('bomb.xml', 'a' * 1000000)
+        zf.writestr('noise.xml', os.urandom(1000000), compress_type=zipfile.ZIP_STORED)
+    
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    with patch.object(processor, '_extract_members') as mock_extract:
+        with pytest.raises(ValueError, match="Potential zip bomb detected in bomb.xml"):
+            processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+    mock_extract.assert_not_called()
+
+def test_validate_xml(processor, tmp_path):
+    """Test XML depth is checked with a parser reused across files"""
+    xml_file = tmp_path / "data.xml"
+    xml_file.write_text('<root><a><b/></a></root>')
+    
+    assert processor._validate_xml(str(xml_file), {'max_depth': 3})
+    assert processor._validate_xml(str(xml_file), {'max_depth': 3})
+    with pytest.raises(ValueError, match="XML depth exceeds maximum of 2"):
+        processor._validate_xml(str(xml_file), {'max_depth': 2})
+
+def test_validate_xml_with_rules(processor, tmp_path):
+    """Test validation rules are checked against the parsed tree"""
+    xml_file = tmp_path / "data.xml"
+    xml_file.write_text('<root><item code="A1"/><item code="ZZ"/></root>')
+    rules = {'item': {'attribute_values': {'code': ['A1', 'B2']}}}
+    
+    with pytest.raises(ValueError, match="Invalid value for attribute code in item: ZZ"):
+        processor._validate_xml(str(xml_file), {'validation_rules': rules})
+
+def test_validate_xml_invalid(processor, tmp_path):
+    """Test malformed XML is rejected"""
+    xml_file = tmp_path / "broken.xml"
+    xml_file.write_text('<root><item></root>')
+    
+    with pytest.raises(expat.ExpatError):
+        processor._validate_xml(str(xml_file), {})
+
+def test_validate_xml_empty(processor, tmp_path):
+    """Test an empty file, which can't be mapped, is rejected as malformed"""
+    xml_file = tmp_path / "empty.xml"
+    xml_file.write_bytes(b'')
+    
+    with pytest.raises(expat.ExpatError):
+        processor._validate_xml(str(xml_file), {})
+
+def test_validate_xml_xxe(processor, tmp_path):
+    """Test DTDs and entity declarations are refused"""
+    xml_file = tmp_path / "xxe.xml"
+    xml_file.write_text(
+        '<!DOCTYPE root [<!ENTITY xxe SYSTEM "file:///etc/passwd">]>'
+        '<root>&xxe;</root>'
+    )
+    
+    with pytest.raises(DTDForbidden):
+        processor._validate_xml(str(xml_file), {})
+    with pytest.raises(EntitiesForbidden):
+        processor._validate_xml(str(xml_file), {'disable_dtd': False})
+
 # tests/test_file_security.py
 
 def test_scan_file_no_clamav(processor, tmp_path):
@@ -125,7 +314,6 @@ def test_scan_file_no_clamav(processor, tmp_path):
     
     # Set clamd to None explicitly to simulate no ClamAV
     processor.clamd = None
-    processor.logger = MagicMock()  # Mock logger to avoid warnings
     
     assert processor._scan_file(str(test_file)) is True
 
@@ -178,4 +366,270 @@ def test_scan_file_error(mock_clamd, processor, tmp_path):
     processor.clamd = mock_scanner
     result = processor._scan_file(str(test_file))
     assert result is False
-    mock_scanner.instream.assert_called_once()
\ No newline at end of file
+    mock_scanner.instream.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_scan_files_concurrently(processor, tmp_path):
+    """Test every attachment is scanned, each with its own clamd client"""
+    clean = tmp_path / "clean.txt"
+    clean.write_text("clean content")
+    infected = tmp_path / "infected.txt"
+    infected.write_text("infected content")
+    
+    def instream(f):
+        return {'stream': ['FOUND' if b'infected' in f.read() else 'OK']}
+    
+    processor.clamd = MagicMock()
+    processor.clamd.instream.side_effect = instream
+    
+    results = await processor.scan_files([str(clean), str(infected)])
+    
+    assert results == {str(clean): True, str(infected): False}
+    assert processor.clamd.instream.call_count == 2
+
+def test_scan_file_large_uses_sendfile(processor, tmp_path):
+    """Test large files are streamed to the clamd socket with sendfile"""
+    test_file = tmp_path / "large.bin"
+    test_file.write_bytes(b'x' * (processor.CLAMD_SENDFILE_THRESHOLD + 10))
+    socket_path = str(tmp_path / "clamd.sock")
+    received = []
+    
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(1)
+    
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            data = b''
+            while not data.endswith(b'\0\0\0\0'):
+                data += conn.recv(65536)
+            received.append(data)
+            conn.sendall(b'stream: OK\0')
+    
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    try:
+        processor.clamd = MagicMock(unix_socket=socket_path, timeout=5)
+        assert processor._scan_file(str(test_file)) is True
+    finally:
+        thread.join(5)
+        server.close()
+    
+    processor.clamd.instream.assert_not_called()
+    payload = received[0]
+    assert payload.startswith(b'zINSTREAM\0' + struct.pack('!L', test_file.stat().st_size))
+    assert payload.count(b'x') == test_file.stat().st_size
+
+def test_extract_zip_forged_compressed_size(processor, tmp_path):
+    """Test ZIP extraction rejects members with content but no stored bytes"""
+    zip_path = tmp_path / "forged.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('test.xml', 'test content')
+    
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    info = zipfile.ZipInfo('test.xml')
+    info.file_size = 12
+    info.compress_size = 0
+    with patch.object(zipfile.ZipFile, 'infolist', return_value=[info]):
+        with pytest.raises(ValueError, match="Invalid compressed size"):
+            processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+
+def test_copy_stream_limit(processor):
+    """Test stream copy aborts once the limit is exceeded"""
+    dst = io.BytesIO()
+    
+    assert processor._copy_stream(io.BytesIO(b'x' * 10), dst, bytearray(4), limit=10) == 10
+    with pytest.raises(ValueError, match="exceeds limit"):
+        processor._copy_stream(io.BytesIO(b'x' * 11), io.BytesIO(), bytearray(4), limit=10)
+
+@pytest.mark.asyncio
+async def test_secure_extract_zip_async(processor, temp_zip, tmp_path):
+    """Test async extraction queues each file, then the end sentinel"""
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    queue = await processor.secure_extract_zip_async(temp_zip, extract_dir, 'test_import')
+    items = [await queue.get() for _ in range(3)]
+    
+    assert sorted(items[:2]) == [os.path.join(extract_dir, 'test1.xml'), os.path.join(extract_dir, 'test2.xml')]
+    assert items[2] is None
+
+@pytest.mark.asyncio
+async def test_secure_extract_zip_async_error(processor, tmp_path):
+    """Test async extraction queues the error when extraction fails"""
+    zip_path = tmp_path / "bad_types.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('test.exe', 'bad content')
+    
+    queue = await processor.secure_extract_zip_async(str(zip_path), str(tmp_path), 'test_import')
+    
+    assert isinstance(await queue.get(), ValueError)
+
+@pytest.mark.asyncio
+async def test_secure_extract_zip_async_cancelled(processor, temp_zip, tmp_path):
+    """Test a cancelled extraction queues CancelledError, not the end sentinel"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    
+    with patch.object(loop, 'run_in_executor', return_value=future):
+        queue = await processor.secure_extract_zip_async(temp_zip, str(tmp_path), 'test_import')
+    future.cancel()
+    
+    assert isinstance(await queue.get(), asyncio.CancelledError)
+
+def test_secure_extract_zip_hashes(processor, temp_zip, tmp_path):
+    """Test extraction hashes files as FileHashTracker would"""
+    from etl_processor.utils.file_hash_tracker import FileHashTracker
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    file_hashes = {}
+    extracted_files = processor.secure_extract_zip(temp_zip, extract_dir, 'test_import', file_hashes=file_hashes)
+    
+    tracker = FileHashTracker.__new__(FileHashTracker)
+    assert set(file_hashes) == set(extracted_files)
+    for path in extracted_files:
+        assert file_hashes[path] == tracker.calculate_file_hash(path)
+
+def test_secure_extract_zip_worker_handles(processor, tmp_path):
+    """Test workers read through their own archive handles, all closed afterwards"""
+    zip_path = tmp_path / "deflated.zip"
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for i in range(8):
+            zf.writestr(f'file{i}.xml', f'<root>{i}</root>' * 10)
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    opened = []
+    real_zipfile = zipfile.ZipFile
+    def track(*args, **kwargs):
+        handle = real_zipfile(*args, **kwargs)
+        opened.append(handle)
+        return handle
+    
+    with patch('etl_processor.security.file_security.zipfile.ZipFile', side_effect=track):
+        extracted = processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+    
+    assert len(extracted) == 8
+    assert len(opened) >= 2
+    assert all(handle.fp is None for handle in opened)
+
+def test_secure_extract_zip_stored_crc(processor, tmp_path):
+    """Test stored members are written straight from the archive, CRC checked"""
+    zip_path = tmp_path / "stored.zip"
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr('data.xml', '<root>stored content</root>')
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    extracted = processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+    assert Path(extracted[0]).read_text() == '<root>stored content</root>'
+    
+    raw = zip_path.read_bytes()
+    zip_path.write_bytes(raw.replace(b'stored content', b'STORED content', 1))
+    with pytest.raises(zipfile.BadZipFile, match="Bad CRC-32"):
+        processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+
+def test_secure_extract_zip_stored_header_mismatch(processor, tmp_path):
+    """Test a local header disagreeing with the central directory is left to zipfile"""
+    zip_path = tmp_path / "stored.zip"
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr('data.xml', '<root/>')
+    # Rename the member in its local header only
+    raw = zip_path.read_bytes()
+    zip_path.write_bytes(raw.replace(b'data.xml', b'evil.xml', 1))
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    with zipfile.ZipFile(zip_path) as zf, open(zip_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        assert processor._stored_span(mapped, zf.infolist()[0]) is None
+    with pytest.raises(zipfile.BadZipFile, match="differ"):
+        processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+
+def test_secure_extract_zip_validates_xml(processor, sample_config, tmp_path):
+    """Test XML members are validated in the extraction workers when configured"""
+    sample_config['security']['file_validation']['xml_validation'] = {'max_depth': 10}
+    zip_path = tmp_path / "refs.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('good.xml', '<root><item/></root>')
+        zf.writestr('bad.xml', '<!DOCTYPE root [<!ENTITY a "b">]><root>&a;</root>')
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    with pytest.raises(DTDForbidden):
+        processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+
+@pytest.mark.parametrize('member', ['/etc/evil.xml', '../evil.xml', 'sub/../../evil.xml'])
+def test_extract_zip_directory_traversal(processor, tmp_path, member):
+    """Test members resolving outside the extraction directory are refused"""
+    zip_path = tmp_path / "traversal.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr(member, '<root/>')
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    with pytest.raises(ValueError, match="Potential directory traversal attack"):
+        processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+
+def test_extract_zip_normalized_target(processor, tmp_path):
+    """Test members are written to the normalized path that was checked"""
+    zip_path = tmp_path / "dotdot.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('a/../b.xml', '<root/>')
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    file_hashes = {}
+    
+    extracted = processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import',
+                                             file_hashes=file_hashes)
+    
+    assert extracted == [os.path.join(extract_dir, 'b.xml')]
+    assert list(file_hashes) == extracted
+    assert os.path.isfile(extracted[0])
+
+def test_extract_zip_duplicate_member(processor, tmp_path):
+    """Test members sharing a target path are refused before extraction"""
+    zip_path = tmp_path / "dupes.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('a.xml', '<first/>')
+        with pytest.warns(UserWarning, match="Duplicate name"):
+            zf.writestr('a.xml', '<second/>')
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    with patch.object(processor, '_extract_members') as mock_extract:
+        with pytest.raises(ValueError, match="Duplicate file in ZIP: a.xml"):
+            processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+    mock_extract.assert_not_called()
+
+def test_extract_zip_dotted_name(processor, tmp_path):
+    """Test names merely containing '..' are not mistaken for traversal"""
+    zip_path = tmp_path / "dotted.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('sub/data..xml', '<root/>')
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    extracted = processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+    assert extracted == [os.path.join(extract_dir, 'sub/data..xml')]
+
+def test_extract_zip_creates_each_dir_once(processor, tmp_path):
+    """Test target directories are created once however many members they hold"""
+    zip_path = tmp_path / "nested.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        for i in range(5):
+            zf.writestr(f'a/b/file{i}.xml', '<root/>')
+        zf.writestr('a/top.xml', '<root/>')
+    extract_dir = str(tmp_path / "extracted")
+    os.makedirs(extract_dir)
+    
+    with patch('etl_processor.security.file_security.os.makedirs', wraps=os.makedirs) as mock_makedirs:
+        extracted = processor.secure_extract_zip(str(zip_path), extract_dir, 'test_import')
+    
+    assert len(extracted) == 6
+    assert mock_makedirs.call_count == 2
+    assert os.path.isfile(os.path.join(extract_dir, 'a/b/file4.xml'))
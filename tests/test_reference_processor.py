@@ -0,0 +1,185 @@
+# tests/test_reference_processor.py
+
+import asyncio
+import zipfile
+import pytest
+from unittest.mock import patch, MagicMock
+from defusedxml import DTDForbidden
+from etl_processor.processors.reference_processor import ReferenceProcessor
+
+@pytest.fixture
+def processor():
+    with patch('etl_processor.processors.reference_processor.ConfigLoader'), \
+            patch('etl_processor.processors.reference_processor.FileHashTracker'):
+        proc = ReferenceProcessor()
+    proc.saved = []
+    proc._save_record = lambda table, data, session: proc.saved.append((table, data))
+    return proc
+
+@pytest.fixture
+def mapping():
+    return {
+        'tables': [
+            {
+                'name': 'items',
+                'root_element': 'Item',
+                'fields': {
+                    'ID': {'db_field': 'id', 'type': 'integer'},
+                    'NAME': {'db_field': 'name', 'type': 'string'}
+                }
+            },
+            {
+                'name': 'header',
+                'fields': {'Version': {'db_field': 'version', 'type': 'string'}}
+            }
+        ]
+    }
+
+@pytest.fixture
+def security_rules(processor):
+    rules = {
+        'file_validation': {
+            'max_size': '50MB',
+            'zip_extraction': {'max_ratio': 15, 'allowed_types': ['.xml']}
+        }
+    }
+    processor.config_loader.get_security_rules.return_value = rules
+    return rules
+
+def _strip_timestamps(saved):
+    return [
+        (table, {k: v for k, v in data.items() if k not in ('created', 'modified')})
+        for table, data in saved
+    ]
+
+def test_process_xml_file(processor, mapping, tmp_path):
+    """Test record and root-level table mappings"""
+    xml_file = tmp_path / "REF.XML"
+    xml_file.write_text(
+        '<Root><Version>2</Version>'
+        '<Item><ID>1</ID><NAME> First </NAME></Item>'
+        '<Item><Detail><ID>2</ID></Detail><NAME>Second<Note>x</Note></NAME></Item>'
+        '<Item><ID></ID></Item>'
+        '</Root>'
+    )
+
+    processor._process_xml_file(str(xml_file), mapping, MagicMock())
+
+    assert _strip_timestamps(processor.saved) == [
+        ('items', {'id': 1, 'name': 'First'}),
+        ('items', {'id': 2, 'name': 'Second'}),
+        ('items', {}),
+        ('header', {'version': '2'})
+    ]
+
+def test_process_xml_file_rejects_dtd(processor, mapping, tmp_path):
+    """Test documents declaring a DTD are refused"""
+    xml_file = tmp_path / "REF.XML"
+    xml_file.write_text(
+        '<!DOCTYPE Root [<!ENTITY name "expanded">]>'
+        '<Root><Item><ID>1</ID><NAME>&name;</NAME></Item></Root>'
+    )
+
+    with pytest.raises(DTDForbidden):
+        processor._process_xml_file(str(xml_file), mapping, MagicMock())
+    assert processor.saved == []
+
+@pytest.mark.asyncio
+async def test_process_reference_archive(processor, mapping, security_rules, tmp_path):
+    """Test reference files are read straight from the archive in reference order"""
+    zip_path = tmp_path / "refs.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('REF.XML', '<Root><Version>3</Version><Item><ID>7</ID></Item></Root>')
+    processor._get_reference_order = lambda import_type: ('REF.XML', 'MISSING.XML')
+    processor.config_loader.get_field_mapping.return_value = mapping
+
+    processed, skipped = await processor.process_reference_archive(str(zip_path), 'bsm', MagicMock())
+
+    assert processed == ['REF.XML']
+    assert skipped == ['MISSING.XML']
+    assert _strip_timestamps(processor.saved) == [
+        ('items', {'id': 7}),
+        ('header', {'version': '3'})
+    ]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('member', ['../REF.XML', 'REF.EXE'])
+async def test_process_reference_archive_checks_members(processor, mapping, security_rules,
+                                                         tmp_path, member):
+    """Test unsafe members are refused before anything is parsed"""
+    zip_path = tmp_path / "refs.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr(member, '<Root><Item><ID>7</ID></Item></Root>')
+    processor._get_reference_order = lambda import_type: ('REF.XML',)
+    processor.config_loader.get_field_mapping.return_value = mapping
+    
+    with pytest.raises(ValueError, match="directory traversal|Invalid file type"):
+        await processor.process_reference_archive(str(zip_path), 'bsm', MagicMock())
+    assert processor.saved == []
+
+def test_iter_reference_files(processor, tmp_path):
+    """Test reference files are yielded in reference order, missing ones as None"""
+    (tmp_path / "B.XML").write_text('<Root/>')
+    (tmp_path / "A.XML").write_text('<Root/>')
+    (tmp_path / "EXTRA.XML").write_text('<Root/>')
+    processor._get_reference_order = lambda import_type: ('B.XML', 'MISSING.XML', 'A.XML')
+
+    result = [
+        (name, entry.path if entry is not None else None)
+        for name, entry in processor.iter_reference_files(str(tmp_path), 'bsm')
+    ]
+
+    assert result == [
+        ('B.XML', str(tmp_path / "B.XML")),
+        ('MISSING.XML', None),
+        ('A.XML', str(tmp_path / "A.XML"))
+    ]
+
+def test_parse_xml_reuses_parser(processor, tmp_path):
+    """Test the lxml parser is shared across files and replaced after an error"""
+    pytest.importorskip('lxml')
+    good = tmp_path / "GOOD.XML"
+    good.write_text('<Root><Version>1</Version></Root>')
+    bad = tmp_path / "BAD.XML"
+    bad.write_text('<Root><Version>')
+
+    processor._parse_xml(str(good))
+    parser = processor._xml_parser
+    assert processor._parse_xml(str(good)).getroot().findtext('Version') == '1'
+    assert processor._xml_parser is parser
+
+    with pytest.raises(Exception):
+        processor._parse_xml(str(bad))
+    assert processor._xml_parser is None
+    assert processor._parse_xml(str(good)).getroot().findtext('Version') == '1'
+
+@pytest.mark.asyncio
+async def test_process_extraction_queue(processor, mapping, tmp_path):
+    """Test queued files are processed in reference order as they arrive"""
+    (tmp_path / "B.XML").write_text('<Root><Item><ID>2</ID></Item></Root>')
+    (tmp_path / "A.XML").write_text('<Root><Item><ID>1</ID></Item></Root>')
+    processor._get_reference_order = lambda import_type: ('A.XML', 'B.XML', 'MISSING.XML')
+    processor.config_loader.get_field_mapping.return_value = {'tables': mapping['tables'][:1]}
+
+    queue = asyncio.Queue()
+    for item in (str(tmp_path / "B.XML"), str(tmp_path / "A.XML"), None):
+        queue.put_nowait(item)
+
+    processed, skipped = await processor.process_extraction_queue(queue, str(tmp_path), 'bsm', MagicMock())
+
+    assert processed == ['A.XML', 'B.XML']
+    assert skipped == ['MISSING.XML']
+    assert _strip_timestamps(processor.saved) == [('items', {'id': 1}), ('items', {'id': 2})]
+
+@pytest.mark.asyncio
+async def test_process_extraction_queue_cancelled(processor, mapping, tmp_path):
+    """Test a cancelled extraction is not mistaken for a complete one"""
+    processor._get_reference_order = lambda import_type: ('A.XML',)
+    processor.config_loader.get_field_mapping.return_value = {'tables': mapping['tables'][:1]}
+    
+    queue = asyncio.Queue()
+    queue.put_nowait(asyncio.CancelledError())
+    
+    with pytest.raises(asyncio.CancelledError):
+        await processor.process_extraction_queue(queue, str(tmp_path), 'bsm', MagicMock())
+    assert processor.saved == []